@@ -0,0 +1,126 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from metrics import Metrics
+
+
+class _ChatSlot:
+    __slots__ = ("sem", "users")
+
+    def __init__(self, limit: int):
+        self.sem = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class UpdateLimiter(BaseMiddleware):
+    """Внешняя middleware на dp.update: не больше max_handlers обработчиков разом и не больше
+    per_chat на один чат; остальные ждут своей очереди.
+
+    Поллинг aiogram заводит задачу на каждое обновление без ограничений, поэтому приём
+    сдерживается отдельно: intake (request-middleware сессии) не выпускает getUpdates,
+    пока в работе и в ожидании больше max_backlog обновлений — остальные полежат у Telegram.
+    deep() — очередь глубже shed_depth: фоновую работу (отложенные удаления) пора придержать.
+    """
+
+    def __init__(self, metrics: Optional[Metrics] = None, max_handlers: int = 64, per_chat: int = 2,
+                 max_backlog: int = 512, shed_depth: int = 128):
+        self.metrics = metrics
+        self.per_chat = per_chat
+        self.max_backlog = max_backlog
+        self.shed_depth = shed_depth
+        self._global = asyncio.Semaphore(max_handlers)
+        self._chats: Dict[Hashable, _ChatSlot] = {}
+        self._room = asyncio.Event()
+        self._room.set()
+        self.active = 0
+        self.queued = 0
+        self.wait_max = 0.0
+        self.intake_paused = 0
+        self.intake = _IntakeGate(self)
+
+    def deep(self) -> bool:
+        return self.queued >= self.shed_depth
+
+    def _update_room(self):
+        if self.active + self.queued < self.max_backlog:
+            self._room.set()
+        else:
+            self._room.clear()
+
+    @staticmethod
+    def _key(data: Dict[str, Any]) -> Optional[Hashable]:
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")   # inline-запросы: чата нет, ограничиваем по пользователю
+        return ("user", user.id) if user is not None else None
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        key = self._key(data)
+        slot = None
+        if key is not None:
+            slot = self._chats.get(key)
+            if slot is None:
+                slot = self._chats[key] = _ChatSlot(self.per_chat)
+            slot.users += 1
+        self.queued += 1
+        self._update_room()
+        started = time.perf_counter()
+        chat_acquired = False
+        try:
+            if slot is not None:
+                await slot.sem.acquire()
+                chat_acquired = True
+            await self._global.acquire()
+        except BaseException:   # отмена, пока ждали слот
+            if chat_acquired:
+                slot.sem.release()
+            self.queued -= 1
+            self._release_slot(key, slot)
+            self._update_room()
+            raise
+        waited = time.perf_counter() - started
+        self.queued -= 1
+        self.active += 1
+        self.wait_max = max(self.wait_max, waited)
+        if self.metrics:
+            self.metrics.observe("update_wait_seconds", waited, "Time an update waited for a handler slot")
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            self._global.release()
+            if slot is not None:
+                slot.sem.release()
+            self._release_slot(key, slot)
+            self._update_room()
+
+    def _release_slot(self, key: Optional[Hashable], slot: Optional[_ChatSlot]):
+        if slot is not None:
+            slot.users -= 1
+            if not slot.users:
+                self._chats.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {"active": self.active, "queued": self.queued, "chats": len(self._chats),
+                "wait_max": self.wait_max, "intake_paused": self.intake_paused}
+
+
+class _IntakeGate(BaseRequestMiddleware):
+    def __init__(self, limiter: UpdateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]):
+        if isinstance(method, GetUpdates) and not self.limiter._room.is_set():
+            self.limiter.intake_paused += 1
+            await self.limiter._room.wait()
+        return await make_request(bot, method)
@@ -0,0 +1,252 @@
+"""Нагрузочный прогон бота против локальной заглушки Bot API (fake_bot_api.py).
+
+Симулированные пользователи проходят сценарии start / navigate / paginate / clear,
+обновления подаются прямо в dp. Итог: пропускная способность, p50/p95/p99 на
+сценарий, вызовов API на одно действие, пиковая память. Результат пишется в
+bench_results/<время>.json и сравнивается с предыдущим прогоном тех же параметров.
+
+    python bench.py --users 200 --latency-ms 40 --flood-rate 0.01
+    python bench.py --users 200 --max-regression 15   # код выхода 1 при просадке
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession
+
+from fake_bot_api import message_update, callback_update
+
+FLOWS: Dict[str, List[str]] = {
+    "start":    ["/start"],
+    "navigate": ["studclubs", "kbk", "back_main", "menu", "laundry", "water", "back_main"],
+    "paginate": ["contacts", "contact_teachers", "teachers_page:2", "teachers_page:3", "teachers_page:4", "contacts"],
+    "clear":    ["/clear"],
+}
+MEDIA_KEYS = {"case_club", "kbk", "falcon", "MCW", "cube", "sport_culture"}
+RESULTS_DIR = "bench_results"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def _wait_http(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    async with ClientSession() as http:
+        while True:
+            try:
+                async with http.get(url) as resp:
+                    if resp.status == 200:
+                        return
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} не поднялся")
+            await asyncio.sleep(0.1)
+
+
+class Simulation:
+    def __init__(self, app, args):
+        self.app, self.args = app, args
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+        self.interactions = 0
+        self._update_id = 0
+        self.rng = random.Random(args.seed)
+
+    def _next_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    async def _step(self, chat_id: int, step: str, last_media: bool) -> None:
+        if step.startswith("/"):
+            update = message_update(self._next_id(), chat_id, step)
+        else:
+            active = await self.app.get_active_msg_id(chat_id) or 1
+            update = callback_update(self._next_id(), chat_id, step, active, photo=last_media)
+        await self.app.dp.feed_raw_update(self.app.bot, update)
+
+    async def user(self, uid: int):
+        chat_id = 500_000 + uid
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp))
+        last_media = False
+        for flow in self.args.flows:
+            for step in FLOWS[flow]:
+                started = time.perf_counter()
+                try:
+                    await self._step(chat_id, step, last_media)
+                except Exception:
+                    self.errors += 1
+                self.latency[flow].append(time.perf_counter() - started)
+                self.interactions += 1
+                last_media = step in MEDIA_KEYS
+                await asyncio.sleep(self.rng.uniform(0, self.args.think_ms / 1000))
+
+
+async def run(args) -> dict:
+    port = _free_port()
+    api_proc = subprocess.Popen([sys.executable, "fake_bot_api.py", "--port", str(port),
+                                 "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                                 "--flood-rate", str(args.flood_rate), "--retry-after", str(args.retry_after),
+                                 "--seed", str(args.seed)])
+    base = f"http://127.0.0.1:{port}"
+    try:
+        await _wait_http(f"{base}/stats")
+        tmp = tempfile.mkdtemp(prefix="gsom-bench-")
+        os.environ.update({
+            "BOT_API_BASE": base, "BOT_TOKEN": "42:bench", "METRICS_PORT": "0",
+            "TG_GLOBAL_RPS": str(args.global_rps), "TG_CHAT_RPS": str(args.chat_rps),
+            "TG_CHAT_BURST": str(args.chat_burst), "REGISTRY_BACKEND": args.registry,
+            "REGISTRY_DB": os.path.join(tmp, "registry.sqlite3"),
+            "MEDIA_CACHE_PATH": os.path.join(tmp, "file_ids.json"),
+            "DEFERRED_PATH": os.path.join(tmp, "deferred.json"),
+            "BROADCAST_DB": os.path.join(tmp, "broadcast.sqlite3"),
+        })
+        import logging
+        import main as app
+        logging.getLogger().setLevel(logging.WARNING)
+        await app.dp.emit_startup(bot=app.bot)
+        await app.bot.me()
+        async with ClientSession() as http:
+            await http.post(f"{base}/stats/reset")
+
+        sim = Simulation(app, args)
+        started = time.perf_counter()
+        await asyncio.gather(*(sim.user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(args.settle)   # отложенные удаления и /clear в фоне
+
+        async with ClientSession() as http:
+            async with http.get(f"{base}/stats") as resp:
+                api_stats = await resp.json()
+        await app.dp.emit_shutdown(bot=app.bot)
+        await app.bot.session.close()
+    finally:
+        api_proc.terminate()
+        api_proc.wait()
+
+    api_calls = sum(api_stats["calls"].values())
+    return {
+        "scenario": {k: getattr(args, k) for k in ("users", "flows", "latency_ms", "jitter_ms", "flood_rate",
+                                                   "retry_after", "think_ms", "global_rps", "chat_rps",
+                                                   "chat_burst", "registry")},
+        "git": _git_rev(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_s": elapsed,
+        "interactions": sim.interactions,
+        "errors": sim.errors,
+        "throughput_rps": sim.interactions / elapsed if elapsed else 0.0,
+        "api_calls": api_stats["calls"],
+        "api_errors": api_stats["errors"],
+        "api_calls_per_interaction": api_calls / sim.interactions if sim.interactions else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "flows": {flow: {"n": len(v), "p50_ms": percentile(v, .5) * 1000, "p95_ms": percentile(v, .95) * 1000,
+                         "p99_ms": percentile(v, .99) * 1000} for flow, v in sim.latency.items()},
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous(result: dict) -> Optional[dict]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    for name in sorted(os.listdir(RESULTS_DIR), reverse=True):
+        with open(os.path.join(RESULTS_DIR, name), encoding="utf-8") as f:
+            old = json.load(f)
+        if old.get("scenario") == result["scenario"]:
+            return old
+    return None
+
+
+def report(result: dict, prev: Optional[dict], max_regression: Optional[float]) -> bool:
+    """Печатает итог и сравнение; False — есть просадка больше max_regression процентов."""
+    def delta(new: float, old: Optional[float], higher_is_better: bool = False) -> str:
+        if not old:
+            return ""
+        pct = (new - old) / old * 100
+        worse = -pct if higher_is_better else pct
+        nonlocal ok
+        if max_regression is not None and worse > max_regression:
+            ok = False
+            return f"  ({pct:+.1f}% REGRESSION)"
+        return f"  ({pct:+.1f}%)"
+
+    ok = True
+    p = prev or {}
+    print(f"interactions: {result['interactions']} in {result['elapsed_s']:.2f}s, errors: {result['errors']}")
+    print(f"throughput: {result['throughput_rps']:.1f}/s" + delta(result["throughput_rps"], p.get("throughput_rps"), True))
+    print(f"api calls/interaction: {result['api_calls_per_interaction']:.2f}"
+          + delta(result["api_calls_per_interaction"], p.get("api_calls_per_interaction")))
+    print(f"peak RSS: {result['peak_rss_mb']:.1f} MB" + delta(result["peak_rss_mb"], p.get("peak_rss_mb")))
+    print(f"api calls: {result['api_calls']}  api errors: {result['api_errors']}")
+    for flow, s in result["flows"].items():
+        old = (p.get("flows") or {}).get(flow, {})
+        print(f"  {flow:9s} n={s['n']:5d}  p50 {s['p50_ms']:7.1f} ms  p95 {s['p95_ms']:7.1f} ms"
+              + delta(s["p95_ms"], old.get("p95_ms")) + f"  p99 {s['p99_ms']:7.1f} ms")
+    if prev:
+        print(f"compared with run {prev['time']} (git {prev.get('git')})")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--flows", nargs="+", default=list(FLOWS), choices=list(FLOWS))
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--think-ms", type=float, default=200, help="пауза пользователя между нажатиями (до)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="разброс старта пользователей, с")
+    parser.add_argument("--global-rps", type=float, default=30)
+    parser.add_argument("--chat-rps", type=float, default=1)
+    parser.add_argument("--chat-burst", type=float, default=3)
+    parser.add_argument("--registry", default="memory", choices=["memory", "sqlite"])
+    parser.add_argument("--settle", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-regression", type=float, default=None, help="допустимая просадка, %%")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    prev = _previous(result)
+    ok = report(result, prev, args.max_regression)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+        print(f"saved {path}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
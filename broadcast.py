@@ -0,0 +1,422 @@
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramMigrateToChat
+
+from outbound import NORMAL, use_priority
+
+log = logging.getLogger(__name__)
+
+# ответы Bot API, после которых чат из рассылки убираем
+_GONE_CHAT = ("chat not found", "user is deactivated", "bot was kicked", "peer_id_invalid")
+_MIN_CHAT_ID = -(2 ** 63)
+
+
+@dataclass
+class Broadcast:
+    id: int
+    text: str
+    photo: Optional[str]        # file_id: одна и та же картинка уходит всем без перезаливки
+    admin_chat: Optional[int]
+
+
+class BroadcastBusy(RuntimeError):
+    def __init__(self, broadcast_id: int):
+        super().__init__(f"broadcast #{broadcast_id} is running")
+        self.broadcast_id = broadcast_id
+
+
+class Broadcaster:
+    """Подписчики и рассылки в SQLite.
+
+    Рассылка — поток: страницы подписчиков читаются по возрастанию chat_id и до отправки
+    помечаются в deliveries как pending (в одной транзакции, поэтому несколько процессов
+    не возьмут один чат дважды), отправители берут чаты из очереди с темпом rate в секунду.
+    Итоги пишутся пачками. После перезапуска рассылка продолжается с тех, кого ещё нет
+    в deliveries: отправленным повторно не уйдёт. Зависшие pending (процесс убит
+    посреди отправки) не повторяются — лучше пропустить, чем прислать дважды.
+    Заблокировавшие бота и удалённые чаты выбывают из подписчиков; группа, ставшая
+    супергруппой, остаётся подписанной под новым id. Сбой посреди рассылки останавливает
+    её целиком: итоги записываются, состояние — failed, продолжить можно через resume().
+
+    Рассылку ведёт один процесс (воркеров webhook может быть несколько): он держит аренду
+    строки broadcasts (owner, lease_until) и продлевает её с каждой страницей. Пока аренда
+    жива, другие процессы новую рассылку не начинают (BroadcastBusy), а осиротевшую —
+    владелец убит — подхватывают по истечении аренды. stop() из любого процесса меняет
+    состояние в базе, владелец замечает это на следующей странице.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY, joined_at INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, created_at INTEGER NOT NULL, admin_chat INTEGER,
+        text TEXT NOT NULL, photo TEXT, state TEXT NOT NULL DEFAULT 'running', finished_at INTEGER,
+        owner TEXT, lease_until REAL
+    );
+    CREATE TABLE IF NOT EXISTS deliveries (
+        broadcast_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, status TEXT NOT NULL,
+        PRIMARY KEY (broadcast_id, chat_id)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, bot: Bot, path: str, rate: float = 25.0, concurrency: int = 20, page_size: int = 50):
+        self.bot = bot
+        self.path = path
+        self.rate = rate
+        self.concurrency = concurrency
+        self.page_size = page_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(broadcasts)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):   # база от прежней версии
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE broadcasts ADD COLUMN {column} {kind}")
+        self._db_lock = threading.Lock()
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # страница расходится за page_size / rate секунд, в очереди и в работе — не больше двух
+        self.lease = max(60.0, 4 * page_size / rate)
+        self._known: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.current: Optional[Broadcast] = None
+        self.progress: Counter = Counter()
+        self.started_at = 0.0
+
+    # ---------- синхронная часть (в потоке) ----------
+    def _query(self, sql: str, args: tuple = ()) -> list:
+        with self._db_lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _take(self, new: Optional[tuple] = None, states: str = "state='running'") -> Optional[Broadcast]:
+        """Берёт рассылку в аренду: новую (new — admin_chat, text, photo) или последнюю подходящую
+        под states. BroadcastBusy — другую ведёт живой владелец; None — брать нечего."""
+        now = time.time()
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                busy = cur.execute("SELECT id FROM broadcasts WHERE state='running' AND lease_until>=? "
+                                   "ORDER BY id DESC LIMIT 1", (now,)).fetchone()
+                if busy:
+                    raise BroadcastBusy(busy[0])
+                if new is not None:
+                    broadcast_id = cur.execute("INSERT INTO broadcasts (created_at, admin_chat, text, photo) "
+                                               "VALUES (?,?,?,?)", (int(now), *new)).lastrowid
+                else:
+                    row = cur.execute(f"SELECT id FROM broadcasts WHERE {states} ORDER BY id DESC LIMIT 1").fetchone()
+                    if not row:
+                        cur.execute("COMMIT")
+                        return None
+                    broadcast_id = row[0]
+                cur.execute("UPDATE broadcasts SET state='running', owner=?, lease_until=? WHERE id=?",
+                            (self._owner, now + self.lease, broadcast_id))
+                row = cur.execute("SELECT id, text, photo, admin_chat FROM broadcasts WHERE id=?",
+                                  (broadcast_id,)).fetchone()
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return Broadcast(*row)
+
+    def _claim_page(self, broadcast_id: int, after: int) -> Optional[List[int]]:
+        """Следующая страница получателей; сразу помечаются pending. Заодно продлевает аренду;
+        None — рассылку остановили или её перехватил другой процесс."""
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if not cur.execute("UPDATE broadcasts SET lease_until=? WHERE id=? AND owner=? AND state='running'",
+                                   (time.time() + self.lease, broadcast_id, self._owner)).rowcount:
+                    cur.execute("COMMIT")
+                    return None
+                ids = [r[0] for r in cur.execute(
+                    "SELECT chat_id FROM subscribers s WHERE chat_id>? AND NOT EXISTS "
+                    "(SELECT 1 FROM deliveries d WHERE d.broadcast_id=? AND d.chat_id=s.chat_id) "
+                    "ORDER BY chat_id LIMIT ?", (after, broadcast_id, self.page_size))]
+                cur.executemany("INSERT INTO deliveries VALUES (?,?,'pending')", [(broadcast_id, c) for c in ids])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return ids
+
+    def _record(self, broadcast_id: int, results: List[Tuple[str, int]], unclaim: List[int] = ()):
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN")
+            try:
+                cur.executemany("UPDATE deliveries SET status=? WHERE broadcast_id=? AND chat_id=?",
+                                [(status, broadcast_id, chat_id) for status, chat_id in results])
+                cur.executemany("DELETE FROM subscribers WHERE chat_id=?",
+                                [(chat_id,) for status, chat_id in results if status == "removed"])
+                cur.executemany("DELETE FROM deliveries WHERE broadcast_id=? AND chat_id=?",
+                                [(broadcast_id, chat_id) for chat_id in unclaim])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    # ---------- подписчики ----------
+    async def start(self):
+        rows = await asyncio.to_thread(self._query, "SELECT chat_id FROM subscribers")
+        self._known = {r[0] for r in rows}
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        """Продолжает прерванную рассылку: сразу при старте и потом раз в lease секунд
+        (владелец мог умереть, не отдав аренду)."""
+        while True:
+            if not self.running():
+                try:
+                    b = await asyncio.to_thread(self._take)
+                except BroadcastBusy:
+                    b = None
+                except Exception:
+                    log.exception("broadcast lease check failed")
+                    b = None
+                if b is not None:
+                    log.info("broadcast #%d interrupted earlier, resuming", b.id)
+                    self._launch(b)
+            await asyncio.sleep(self.lease)
+
+    async def close(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        await self.stop(state="running")   # прерванная остановкой бота рассылка продолжится при старте
+        self._db.close()
+
+    async def subscribe(self, chat_id: int):
+        if chat_id in self._known:
+            return
+        self._known.add(chat_id)
+        await asyncio.to_thread(self._query, "INSERT OR IGNORE INTO subscribers VALUES (?,?)", (chat_id, int(time.time())))
+
+    def subscribers(self) -> int:
+        return len(self._known)
+
+    # ---------- рассылка ----------
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def create(self, text: str, photo: Optional[str], admin_chat: Optional[int]) -> Broadcast:
+        """BroadcastBusy, если рассылка уже идёт (в этом или другом процессе)."""
+        b = await asyncio.to_thread(self._take, (admin_chat, text, photo))
+        self._launch(b)
+        return b
+
+    async def resume(self) -> Optional[Broadcast]:
+        b = await asyncio.to_thread(self._take, None, "state!='done'")
+        if b is not None:
+            self._launch(b)
+        return b
+
+    async def stop(self, state: str = "cancelled", timeout: float = 30):
+        if not self.running():
+            if state != "running":   # рассылку ведёт другой процесс: он увидит новое состояние на следующей странице
+                await asyncio.to_thread(self._query, "UPDATE broadcasts SET state=? WHERE state='running'", (state,))
+            return
+        b = self.current
+        self._stopping = True   # отправители дошлют начатое, остальное вернётся в очередь рассылки
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            log.warning("broadcast #%d did not stop in %ss, cancelling", b.id, timeout)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self._query, "UPDATE broadcasts SET state=?, owner=NULL, lease_until=NULL "
+                                             "WHERE id=? AND owner=?", (state, b.id, self._owner))
+
+    def _launch(self, b: Broadcast):
+        self.current = b
+        self.progress = Counter()
+        self.started_at = time.monotonic()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(b))
+        self._task.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            log.error("broadcast failed", exc_info=task.exception())
+
+    def _adopt(self, broadcast_id: int, old: int, new: int) -> bool:
+        """Группа стала супергруппой: подписан теперь новый id. True — в эту рассылку он ещё не попадал."""
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("DELETE FROM subscribers WHERE chat_id=?", (old,))
+                cur.execute("INSERT OR IGNORE INTO subscribers VALUES (?,?)", (new, int(time.time())))
+                fresh = cur.execute("INSERT OR IGNORE INTO deliveries VALUES (?,?,'pending')",
+                                    (broadcast_id, new)).rowcount == 1
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return fresh
+
+    async def _deliver(self, b: Broadcast, chat_id: int) -> str:
+        try:
+            if b.photo:
+                await self.bot.send_photo(chat_id, b.photo, caption=b.text or None, parse_mode="HTML")
+            else:
+                await self.bot.send_message(chat_id, b.text, parse_mode="HTML", disable_web_page_preview=True)
+            return "sent"
+        except TelegramForbiddenError:
+            return "removed"
+        except TelegramBadRequest as e:
+            if any(m in str(e).lower() for m in _GONE_CHAT):
+                return "removed"
+            log.warning("broadcast #%d chat=%s: %s", b.id, chat_id, e)
+            return "failed"
+        except TelegramMigrateToChat:
+            raise   # разбирает _send_to
+        except TelegramAPIError as e:   # 429 после всех повторов, сеть, 5xx и прочее: один чат рассылку не роняет
+            log.warning("broadcast #%d chat=%s: %s", b.id, chat_id, e)
+            return "failed"
+
+    async def _send_to(self, b: Broadcast, chat_id: int) -> List[Tuple[str, int]]:
+        """Итоги по чату; группа, ставшая супергруппой, получает рассылку по новому id."""
+        try:
+            return [(await self._deliver(b, chat_id), chat_id)]
+        except TelegramMigrateToChat as e:
+            new_id = e.migrate_to_chat_id
+        log.info("broadcast #%d: chat %s migrated to %s", b.id, chat_id, new_id)
+        self._known.discard(chat_id)
+        self._known.add(new_id)
+        if not await asyncio.to_thread(self._adopt, b.id, chat_id, new_id):
+            return [("removed", chat_id)]
+        try:
+            status = await self._deliver(b, new_id)
+        except TelegramMigrateToChat:
+            status = "failed"
+        return [("removed", chat_id), (status, new_id)]
+
+    async def _run(self, b: Broadcast):
+        use_priority(NORMAL)   # ответы пользователям в общей очереди API идут раньше рассылки
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.page_size)
+        results: List[Tuple[str, int]] = []
+        unsent: List[int] = []   # взяты в работу, но при остановке не отправлены — вернём
+        backlog: List[int] = []  # остаток взятой страницы, ещё не попавший в очередь
+        claim: Optional[asyncio.Future] = None   # страница, которую сейчас берёт поток
+        interval = 1 / self.rate
+        next_at = time.monotonic()
+
+        async def flush():
+            batch, back = results[:], unsent[:]
+            del results[:], unsent[:]
+            if batch or back:
+                await asyncio.to_thread(self._record, b.id, batch, back)
+
+        async def produce():
+            nonlocal claim
+            after = _MIN_CHAT_ID
+            while not self._stopping:
+                claim = asyncio.ensure_future(asyncio.to_thread(self._claim_page, b.id, after))
+                page = await asyncio.shield(claim)
+                claim = None
+                if page is None:   # остановлена из другого процесса или аренду перехватили
+                    self._stopping = True
+                    break
+                if not page:
+                    break
+                after = page[-1]
+                backlog[:] = page
+                while backlog:
+                    await queue.put(backlog[0])
+                    backlog.pop(0)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def send():
+            nonlocal next_at
+            while (chat_id := await queue.get()) is not None:
+                now = time.monotonic()
+                slot, next_at = max(now, next_at), max(now, next_at) + interval
+                if slot > now and not self._stopping:
+                    await asyncio.sleep(slot - now)
+                if self._stopping:
+                    unsent.append(chat_id)
+                    continue
+                for status, cid in await self._send_to(b, chat_id):
+                    self.progress[status] += 1
+                    results.append((status, cid))
+                    if status == "removed":
+                        self._known.discard(cid)
+                if len(results) >= self.page_size:
+                    await flush()
+
+        # остановка — флагом, не отменой: иначе взятая в потоке страница повиснет в pending.
+        # Упавший отправитель или producer останавливает всю рассылку (TaskGroup отменит остальных)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(produce())
+                for _ in range(self.concurrency):
+                    tg.create_task(send())
+        except Exception:
+            await asyncio.to_thread(self._query, "UPDATE broadcasts SET state='failed', owner=NULL, lease_until=NULL "
+                                                 "WHERE id=? AND owner=?", (b.id, self._owner))
+            await self._notify(b, f"⚠️ Рассылка #{b.id} прервана ошибкой, подробности в логе. "
+                                  f"Продолжить: /broadcast resume")
+            raise
+        finally:
+            if claim is not None:   # producer отменён, пока поток брал страницу: она уже помечена pending
+                backlog.extend(await asyncio.shield(claim))
+            unsent.extend(backlog)   # взятые, но так и не отправленные — обратно в очередь рассылки
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+                if chat_id is not None:
+                    unsent.append(chat_id)
+            await asyncio.shield(flush())
+        if self._stopping:
+            return
+        await asyncio.to_thread(self._query, "UPDATE broadcasts SET state='done', finished_at=?, owner=NULL, "
+                                             "lease_until=NULL WHERE id=?", (int(time.time()), b.id))
+        await self._report(b)
+
+    async def _report(self, b: Broadcast):
+        rows = await asyncio.to_thread(
+            self._query, "SELECT status, COUNT(*) FROM deliveries WHERE broadcast_id=? GROUP BY status", (b.id,))
+        total = dict(rows)
+        elapsed = time.monotonic() - self.started_at
+        done_now = sum(self.progress.values())
+        text = (f"📣 Рассылка #{b.id} завершена: доставлено {total.get('sent', 0)}, "
+                f"ошибок {total.get('failed', 0)}, выбыло {total.get('removed', 0)}"
+                + (f", не подтверждено {total['pending']}" if total.get("pending") else "")
+                + f". В этом запуске {done_now} за {elapsed:.1f} с ({done_now / elapsed if elapsed else 0:.1f}/с).")
+        log.info(text)
+        await self._notify(b, text)
+
+    async def _notify(self, b: Broadcast, text: str):
+        if b.admin_chat:
+            try:
+                await self.bot.send_message(b.admin_chat, text)
+            except Exception:
+                log.warning("broadcast #%d report not delivered", b.id)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.current else 0.0
+        done = sum(self.progress.values())
+        return {"subscribers": len(self._known), "running": int(self.running()),
+                "sent": self.progress["sent"], "failed": self.progress["failed"],
+                "removed": self.progress["removed"], "rate": done / elapsed if elapsed else 0.0}
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+log = logging.getLogger(__name__)
+
+DELETE_WINDOW = 48 * 3600   # Telegram не даёт удалять сообщения старше 48 часов
+BATCH_SIZE = 100            # лимит deleteMessages на один вызов
+MAX_RETRIES = 3
+
+
+@dataclass
+class DeleteReport:
+    requested: int = 0
+    deleted: int = 0        # ушли в успешный deleteMessages (Telegram молча пропускает уже удалённые)
+    skipped_old: int = 0    # старше окна удаления — API не дёргали
+    failed: int = 0
+    api_calls: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self) -> str:
+        return (f"deleted={self.deleted}/{self.requested} skipped_old={self.skipped_old} "
+                f"failed={self.failed} calls={self.api_calls} in {self.elapsed:.2f}s")
+
+
+def split_fresh(items: Iterable[Tuple[int, Optional[float]]], now: Optional[float] = None,
+                window: float = DELETE_WINDOW) -> Tuple[List[int], int]:
+    """Отделяет id, которые ещё можно удалить, от вышедших за окно. Без даты — пробуем удалить."""
+    now = time.time() if now is None else now
+    fresh, old = [], 0
+    for mid, sent_at in items:
+        if sent_at is not None and now - sent_at >= window:
+            old += 1
+        else:
+            fresh.append(mid)
+    return sorted(set(fresh)), old
+
+
+async def _delete_batch(bot: Bot, chat_id: int, ids: List[int], report: DeleteReport):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            await bot.delete_messages(chat_id, ids)
+            report.deleted += len(ids)
+            return
+        except TelegramRetryAfter as e:
+            if attempt == MAX_RETRIES:
+                break
+            await asyncio.sleep(e.retry_after)
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            # «message to delete not found» и пр.: в пачке не осталось ничего удаляемого
+            log.debug("deleteMessages chat=%s failed: %s", chat_id, e)
+            break
+        finally:
+            report.api_calls += 1
+    report.failed += len(ids)
+
+
+async def bulk_delete(bot: Bot, chat_id: int, items: Iterable[Tuple[int, Optional[float]]],
+                      concurrency: int = 3) -> DeleteReport:
+    """Удаляет сообщения чата пачками deleteMessages по BATCH_SIZE, не более concurrency пачек разом.
+
+    items — пары (message_id, unix-время отправки или None)."""
+    started = time.monotonic()
+    ids, old = split_fresh(items)
+    report = DeleteReport(requested=len(ids) + old, skipped_old=old)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(batch: List[int]):
+        async with sem:
+            await _delete_batch(bot, chat_id, batch, report)
+
+    await asyncio.gather(*(run(ids[i:i + BATCH_SIZE]) for i in range(0, len(ids), BATCH_SIZE)))
+    report.elapsed = time.monotonic() - started
+    return report
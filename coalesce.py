@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Set
+
+log = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class Coalescer:
+    """Одна отрисовка на ключ (чат) за раз; пока она идёт, новые нажатия не запускаются
+    параллельно, а ждут в единственном слоте «следующее» — более свежее вытесняет прежнее.
+
+    Слот разбирает тот, кто уже рисует: после своей задачи он выполняет последнюю
+    отложенную. coalesced — нажатий, попавших в слот; dropped — вытесненных, не отрисованных.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, Job] = {}
+        self._running: Set[Hashable] = set()
+        self.coalesced = 0
+        self.dropped = 0
+
+    async def run(self, key: Hashable, job: Job) -> bool:
+        """False — задача отложена (её выполнит текущий исполнитель или её вытеснят)."""
+        if key in self._running:
+            if key in self._pending:
+                self.dropped += 1
+            self._pending[key] = job
+            self.coalesced += 1
+            return False
+        self._running.add(key)
+        try:
+            while job is not None:
+                try:
+                    await job()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    if key not in self._pending:
+                        raise
+                    # ошибка промежуточной отрисовки не должна терять последнее нажатие
+                    log.exception("render for %s failed, continuing with the latest tap", key)
+                job = self._pending.pop(key, None)
+        finally:
+            self._running.discard(key)
+            self._pending.pop(key, None)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._running), "pending": len(self._pending),
+                "coalesced": self.coalesced, "dropped": self.dropped}
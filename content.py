@@ -0,0 +1,259 @@
+"""Контент бота в файлах content/*.json: тексты разделов, контакты администрации,
+преподаватели, клубы. Каждый файл — отдельный раздел.
+
+ContentStore читает и проверяет разделы. ContentWatcher раз в interval секунд сверяет
+mtime и размер файлов, перечитывает только изменившиеся и отдаёт их в on_change;
+раздел, не прошедший проверку, не применяется — остаётся прежняя версия.
+
+Карточка в файле — {"html": "..."} или {"title": "...", "lines": [...], "footer": "..."}.
+Разметка проверяется по правилам HTML-режима Telegram: только его теги, все теги закрыты.
+"""
+import os
+import json
+import asyncio
+import logging
+from html.parser import HTMLParser
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+SECTIONS = ("texts", "admin_contacts", "teachers", "clubs")
+TEXT_SECTIONS = ("welcome", "laundry", "water", "lost")
+TEXT_LIMIT = 4096      # длина текста сообщения в Telegram
+CAPTION_LIMIT = 1024   # длина подписи к фото
+
+
+class ContentError(ValueError):
+    pass
+
+
+def _require(cond: bool, where: str, msg: str):
+    if not cond:
+        raise ContentError(f"{where}: {msg}")
+
+
+# теги parse_mode=HTML и их допустимые атрибуты (https://core.telegram.org/bots/api#html-style)
+TAGS: Dict[str, Tuple[str, ...]] = {
+    "b": (), "strong": (), "i": (), "em": (), "u": (), "ins": (), "s": (), "strike": (), "del": (),
+    "span": ("class",), "tg-spoiler": (), "a": ("href",), "code": ("class",), "pre": (),
+    "blockquote": ("expandable",), "tg-emoji": ("emoji-id",),
+}
+ENTITIES = ("lt", "gt", "amp", "quot")
+
+
+class _MarkupChecker(HTMLParser):
+    """Проверка разметки: первая ошибка — в self.error, открытые теги — в self.stack."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack: List[str] = []
+        self.error: Optional[str] = None
+
+    def _fail(self, msg: str):
+        if self.error is None:
+            self.error = msg
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in TAGS:
+            return self._fail(f"тег <{tag}> не поддерживается Telegram")
+        extra = [name for name, _ in attrs if name not in TAGS[tag]]
+        if extra:
+            return self._fail(f"у <{tag}> лишние атрибуты {extra}")
+        values = dict(attrs)
+        if tag == "span" and values.get("class") != "tg-spoiler":
+            return self._fail('<span> только с class="tg-spoiler"')
+        if tag == "a" and not values.get("href"):
+            return self._fail("<a> без href")
+        if tag == "tg-emoji" and not values.get("emoji-id"):
+            return self._fail("<tg-emoji> без emoji-id")
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._fail(f"<{tag}/>: самозакрывающиеся теги не поддерживаются")
+
+    def handle_endtag(self, tag):
+        if not self.stack:
+            return self._fail(f"лишний </{tag}>")
+        if self.stack[-1] != tag:
+            return self._fail(f"</{tag}> вместо </{self.stack[-1]}>")
+        self.stack.pop()
+
+    def handle_entityref(self, name):
+        if name not in ENTITIES:
+            self._fail(f"&{name}; не поддерживается, только {', '.join(ENTITIES)}")
+
+    def handle_comment(self, data):
+        self._fail("комментарии не поддерживаются")
+
+    def handle_decl(self, decl):
+        self._fail(f"<!{decl}> не поддерживается")
+
+    def handle_pi(self, data):
+        self._fail(f"<?{data}> не поддерживается")
+
+    def unknown_decl(self, data):
+        self._fail(f"<![{data}]> не поддерживается")
+
+
+def _check_markup(text: str, where: str):
+    """ContentError, если Telegram не примет text как parse_mode=HTML."""
+    checker = _MarkupChecker()
+    checker.feed(text)
+    checker.close()
+    _require(checker.error is None, where, checker.error or "")
+    _require(not checker.stack, where, f"не закрыт <{checker.stack[-1]}>" if checker.stack else "")
+
+
+def _check_card(raw: Any, where: str) -> dict:
+    _require(isinstance(raw, dict), where, "ожидается объект")
+    if "html" in raw:
+        _require(isinstance(raw["html"], str) and raw["html"].strip(), where, "пустой html")
+        _check_markup(raw["html"], where)
+        size = len(raw["html"])
+    else:
+        _require(isinstance(raw.get("title"), str), where, "нужен html или title + lines")
+        lines = raw.get("lines")
+        _require(isinstance(lines, list) and all(isinstance(l, str) for l in lines), where, "lines — список строк")
+        _require(isinstance(raw.get("footer", ""), str), where, "footer — строка")
+        _check_markup(raw["title"], where)   # заголовок оборачивается в <b> отдельно от тела
+        _check_markup("\n".join([*lines, raw.get("footer", "")]), where)
+        size = len(raw["title"]) + sum(len(l) + 1 for l in lines) + len(raw.get("footer", ""))
+    _require(size <= TEXT_LIMIT, where, f"длиннее {TEXT_LIMIT} символов")
+    return raw
+
+
+def _check_texts(raw: Any) -> dict:
+    _require(isinstance(raw, dict), "texts", "ожидается объект")
+    missing = [k for k in TEXT_SECTIONS if k not in raw]
+    _require(not missing, "texts", f"нет разделов {missing}")
+    return {k: _check_card(v, f"texts.{k}") for k, v in raw.items()}
+
+
+def _check_teachers(raw: Any) -> List[str]:
+    _require(isinstance(raw, list) and raw, "teachers", "ожидается непустой список строк")
+    for i, line in enumerate(raw):
+        _require(isinstance(line, str) and " — " in line, f"teachers[{i}]", "строка вида «ФИО — должность, почта»")
+        _check_markup(line, f"teachers[{i}]")
+    return raw
+
+
+def _check_clubs(raw: Any) -> List[dict]:
+    _require(isinstance(raw, list) and raw, "clubs", "ожидается непустой список")
+    seen = set()
+    for i, club in enumerate(raw):
+        where = f"clubs[{i}]"
+        _require(isinstance(club, dict), where, "ожидается объект")
+        for field in ("key", "title", "image", "caption"):
+            _require(isinstance(club.get(field), str) and club[field], where, f"нет поля {field}")
+        _require(":" not in club["key"] and len(club["key"].encode()) <= 64, where, "key — до 64 байт, без «:»")
+        _require(club["key"] not in seen, where, f"повтор key {club['key']}")
+        _require(os.path.isfile(club["image"]), where, f"нет файла {club['image']}")
+        _require(len(club["caption"]) <= CAPTION_LIMIT, where, f"подпись длиннее {CAPTION_LIMIT} символов")
+        _check_markup(club["caption"], where)
+        seen.add(club["key"])
+    return raw
+
+
+VALIDATORS: Dict[str, Callable[[Any], Any]] = {
+    "texts": _check_texts,
+    "admin_contacts": lambda raw: _check_card(raw, "admin_contacts"),
+    "teachers": _check_teachers,
+    "clubs": _check_clubs,
+}
+
+Stamp = Optional[Tuple[int, int]]
+
+
+class ContentStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.data: Dict[str, Any] = {}
+        self._stamps: Dict[str, Stamp] = {}
+
+    def path(self, section: str) -> str:
+        return os.path.join(self.root, f"{section}.json")
+
+    def _stamp(self, section: str) -> Stamp:
+        try:
+            st = os.stat(self.path(section))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, section: str) -> Any:
+        """Читает и проверяет один раздел; ContentError, если файл битый."""
+        try:
+            with open(self.path(section), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ContentError(f"{self.path(section)}: {e}") from e
+        return VALIDATORS[section](raw)
+
+    def load_all(self):
+        for section in SECTIONS:
+            self._stamps[section] = self._stamp(section)
+            self.data[section] = self.load(section)
+
+    def changed(self) -> List[str]:
+        return [s for s in SECTIONS if self._stamp(s) != self._stamps.get(s)]
+
+    def reload(self, sections: Iterable[str]) -> Dict[str, Any]:
+        """Новые версии разделов, прошедших проверку. self.data не трогает — см. commit()."""
+        fresh = {}
+        for section in sections:
+            self._stamps[section] = self._stamp(section)   # битый файл не перечитываем до следующей правки
+            try:
+                fresh[section] = self.load(section)
+            except ContentError as e:
+                log.warning("content section %s rejected, keeping previous version: %s", section, e)
+        return fresh
+
+    def commit(self, fresh: Dict[str, Any]):
+        self.data.update(fresh)
+
+
+class ContentWatcher:
+    """Опрос файлов контента в фоне; файловая система трогается только из потока."""
+
+    def __init__(self, store: ContentStore, on_change: Callable[[Dict[str, Any]], Awaitable[None]],
+                 interval: float = 2.0):
+        self.store = store
+        self.on_change = on_change
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self) -> List[str]:
+        """Один проход: применённые разделы."""
+        changed = await asyncio.to_thread(self.store.changed)
+        if not changed:
+            return []
+        fresh = await asyncio.to_thread(self.store.reload, changed)
+        if not fresh:
+            return []
+        await self.on_change(fresh)
+        self.store.commit(fresh)
+        return list(fresh)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                applied = await self.check()
+            except Exception:
+                log.exception("content reload failed, keeping previous version")
+                continue
+            if applied:
+                log.info("content reloaded: %s", ", ".join(applied))
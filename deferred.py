@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from bulk_delete import bulk_delete
+
+log = logging.getLogger(__name__)
+
+Item = Tuple[float, int, int]   # (когда удалить, unix-время; chat_id; message_id)
+
+
+class DeferredDeleter:
+    """Отложенные удаления: одна куча и одна задача вместо спящей задачи на каждое сообщение.
+
+    Созревшие удаления (с запасом slack, чтобы соседние попали в одну пачку) группируются
+    по чатам и уходят через bulk_delete — deleteMessages пачкой. Очередь периодически
+    сохраняется в JSON: после перезапуска недоделанное доудаляется. stop() дожидается
+    текущей пачки и удаляет всё оставшееся сразу; что не успело — остаётся в файле.
+    Пока pressure() истинно, созревшие удаления переносятся на postpone секунд.
+    """
+
+    def __init__(self, bot: Bot, path: str, slack: float = 0.25, concurrency: int = 4,
+                 save_interval: float = 2.0, pressure: Optional[Callable[[], bool]] = None,
+                 postpone: float = 5.0):
+        self.bot = bot
+        self.path = path
+        self.slack = slack
+        self.concurrency = concurrency
+        self.save_interval = save_interval
+        self.pressure = pressure     # True — бот перегружен: созревшие удаления откладываем на postpone
+        self.postpone = postpone
+        self._heap: List[Item] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._dirty = False
+        self.deleted = 0
+        self.batches = 0
+        self.postponed = 0
+
+    # ---------- диск ----------
+    def _load(self) -> List[Item]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return [(float(due), int(chat), int(mid)) for due, chat, mid in json.load(f)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("deferred queue %s unreadable, starting empty: %s", self.path, e)
+            return []
+
+    def _write(self, items: List[Item]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+        os.replace(tmp, self.path)
+
+    async def _save(self, items: Optional[List[Item]] = None):
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, list(self._heap) if items is None else items)
+        except OSError as e:
+            log.warning("deferred queue %s not saved: %s", self.path, e)
+
+    # ---------- API ----------
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        item = (time.time() + delay, chat_id, message_id)
+        heapq.heappush(self._heap, item)
+        self._dirty = True
+        if self._heap[0] is item:   # новое ближайшее — будим цикл раньше
+            self._wake.set()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def start(self):
+        for item in await asyncio.to_thread(self._load):
+            heapq.heappush(self._heap, item)
+        if self._heap:
+            log.info("deferred: %d deletions restored from %s", len(self._heap), self.path)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        items, self._heap = self._heap, []
+        if items:
+            try:
+                await asyncio.wait_for(self._execute(items), timeout)
+                items = []
+            except asyncio.TimeoutError:
+                log.warning("deferred: drain timed out, %d deletions kept for next start", len(items))
+        await self._save(items)
+
+    # ---------- цикл ----------
+    def _pop_due(self, horizon: float) -> List[Item]:
+        due = []
+        while self._heap and self._heap[0][0] <= horizon:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+    async def _execute(self, items: List[Item]):
+        by_chat: Dict[int, List[Tuple[int, None]]] = defaultdict(list)
+        for _, chat_id, mid in items:
+            by_chat[chat_id].append((mid, None))
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def run(chat_id: int, ids: List[Tuple[int, None]]):
+            async with sem:
+                report = await bulk_delete(self.bot, chat_id, ids, concurrency=1)
+                self.deleted += report.deleted
+                self.batches += report.api_calls
+
+        await asyncio.gather(*(run(c, ids) for c, ids in by_chat.items()), return_exceptions=True)
+
+    async def _run(self):
+        last_save = time.monotonic()
+        while not self._stopping:
+            wait = self.save_interval
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - time.time())
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            if self._stopping:
+                break
+            due = self._pop_due(time.time() + self.slack)
+            if due and self.pressure and self.pressure():
+                later = time.time() + self.postpone
+                for _, chat_id, mid in due:
+                    heapq.heappush(self._heap, (later, chat_id, mid))
+                self.postponed += len(due)
+                due = []
+            if due:
+                self._dirty = True
+                try:
+                    await self._execute(due)
+                except Exception:
+                    log.exception("deferred deletions failed")
+            if self._dirty and time.monotonic() - last_save >= self.save_interval:
+                await self._save()
+                last_save = time.monotonic()
@@ -0,0 +1,183 @@
+"""Локальная заглушка Bot API для замеров без настоящего Telegram.
+
+Отвечает на вызовы бота правдоподобными результатами (id сообщений растут по чатам),
+помнит содержимое отправленных сообщений (повторная правка без изменений — 400
+«message is not modified», как у Telegram), умеет добавлять задержку и отвечать 429.
+Чаты с id на …403 считаются заблокировавшими бота (403 на отправку), группы из migrated —
+ставшими супергруппами (400 с migrate_to_chat_id), file_id из rejected_file_ids — протухшими
+(400 «wrong file identifier»). Кому что ушло — в sent, удаления — в deletes.
+
+Запуск отдельно: python fake_bot_api.py --port 8081 --latency-ms 40 --flood-rate 0.01,
+затем BOT_API_BASE=http://127.0.0.1:8081. Счётчики вызовов: GET /stats, сброс: POST /stats/reset.
+"""
+import time
+import json
+import random
+import asyncio
+import argparse
+import contextlib
+from collections import Counter, defaultdict
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from aiohttp import web
+
+BLOCKED_SUFFIX = 403   # чаты с id, оканчивающимся на 403, «заблокировали бота» — для рассылок
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "GSoM Assistant", "username": "gsom_fake_bot"}
+_EDITS = {"editMessageText", "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup"}
+
+
+def message_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Входящее сообщение пользователя (команды размечаются как bot_command)."""
+    msg = {"message_id": update_id + 1, "date": int(time.time()), "text": text,
+           "chat": {"id": chat_id, "type": "private"},
+           "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}}
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def callback_update(update_id: int, chat_id: int, data: str, message_id: int = 1, photo: bool = False) -> dict:
+    """Нажатие inline-кнопки под сообщением бота message_id."""
+    card = {"message_id": message_id, "date": int(time.time()), "from": BOT_USER,
+            "chat": {"id": chat_id, "type": "private"}}
+    if photo:
+        card["photo"] = [{"file_id": "fake-photo", "file_unique_id": "fake-photo-u", "width": 1280, "height": 720}]
+    else:
+        card["text"] = "card"
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": str(chat_id), "data": data, "message": card,
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}}}
+
+
+class FakeBotAPI:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, flood_rate: float = 0,
+                 retry_after: int = 1, seed: int = 0):
+        self.latency, self.jitter = latency_ms / 1000, jitter_ms / 1000
+        self.flood_rate, self.retry_after = flood_rate, retry_after
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._next_mid: Dict[int, int] = defaultdict(lambda: 1_000_000)
+        self._content: Dict[Tuple[int, int], tuple] = {}   # (chat, mid) -> что сейчас показано
+        self.sent: List[Tuple[str, int]] = []              # (метод, чат) успешных sendMessage/sendPhoto
+        self.deletes: List[Tuple[int, List[int]]] = []     # (чат, id) каждого вызова удаления
+        self.migrated: Dict[int, int] = {}                 # группа -> супергруппа
+        self.rejected_file_ids: Set[str] = set()
+
+    def _new_mid(self, chat_id: int) -> int:
+        self._next_mid[chat_id] += 1
+        return self._next_mid[chat_id]
+
+    def _message(self, chat_id: int, mid: int, **extra) -> dict:
+        msg = {"message_id": mid, "date": int(time.time()), "from": BOT_USER,
+               "chat": {"id": chat_id, "type": "private"}}
+        msg.update(extra)
+        return msg
+
+    @staticmethod
+    def _shown(method: str, params: dict) -> tuple:
+        media = params.get("media") or {}
+        body = params.get("text") or params.get("caption") or (media.get("caption") if isinstance(media, dict) else "")
+        photo = params.get("photo") or (media.get("media") if isinstance(media, dict) else None)
+        if photo is not None and not isinstance(photo, str):
+            photo = "upload"   # сам файл не храним
+        return body, photo, json.dumps(params.get("reply_markup"), sort_keys=True)
+
+    def result(self, method: str, params: dict):
+        """(http-статус, тело ответа)"""
+        chat_id = int(params.get("chat_id", 0) or 0)
+        if method == "getMe":
+            return 200, BOT_USER
+        if method in ("sendMessage", "sendPhoto") and chat_id % 1000 == BLOCKED_SUFFIX:
+            return 403, "Forbidden: bot was blocked by the user"
+        if self._shown(method, params)[1] in self.rejected_file_ids:
+            return 400, "Bad Request: wrong file identifier/HTTP URL specified"
+        if chat_id in self.migrated:
+            return 400, {"description": "Bad Request: group chat was upgraded to a supergroup chat",
+                         "parameters": {"migrate_to_chat_id": self.migrated[chat_id]}}
+        if method in ("sendMessage", "sendPhoto"):
+            self.sent.append((method, chat_id))
+            mid = self._new_mid(chat_id)
+            self._content[(chat_id, mid)] = self._shown(method, params)
+            extra = {"text": params.get("text", "")} if method == "sendMessage" else {"photo": [
+                {"file_id": "fake-photo", "file_unique_id": "fake-photo-u", "width": 1280, "height": 720}]}
+            return 200, self._message(chat_id, mid, **extra)
+        if method in _EDITS:
+            mid = int(params.get("message_id", 0))
+            shown = self._shown(method, params)
+            if self._content.get((chat_id, mid)) == shown:
+                return 400, "Bad Request: message is not modified: specified new message content and "\
+                            "reply markup are exactly the same as a current content and reply markup of the message"
+            self._content[(chat_id, mid)] = shown
+            return 200, self._message(chat_id, mid, text=shown[0] or "")
+        if method in ("deleteMessage", "deleteMessages"):
+            ids = [int(m) for m in params.get("message_ids") or [params.get("message_id", 0)]]
+            self.deletes.append((chat_id, ids))
+            for mid in ids:
+                self._content.pop((chat_id, mid), None)
+        return 200, True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        for key, value in params.items():
+            if isinstance(value, str) and value[:1] in "[{":
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        self.calls[method] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if method != "getMe" and self.flood_rate and self.rng.random() < self.flood_rate:
+            self.errors["429"] += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": f"Too Many Requests: retry after {self.retry_after}",
+                                      "parameters": {"retry_after": self.retry_after}}, status=429)
+        status, result = self.result(method, params)
+        if status != 200:
+            self.errors[str(status)] += 1
+            error = result if isinstance(result, dict) else {"description": result}
+            return web.json_response({"ok": False, "error_code": status, **error}, status=status)
+        return web.json_response({"ok": True, "result": result})
+
+    async def stats(self, _: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls), "errors": dict(self.errors)})
+
+    async def reset(self, _: web.Request) -> web.Response:
+        self.calls.clear()
+        self.errors.clear()
+        return web.json_response({"ok": True})
+
+    @contextlib.asynccontextmanager
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> AsyncIterator[str]:
+        """Поднимает заглушку в текущем цикле событий (port=0 — свободный порт); отдаёт BOT_API_BASE."""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        try:
+            yield f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        finally:
+            await runner.cleanup()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/stats/reset", self.reset)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--flood-rate", type=float, default=0, help="доля ответов 429 (0..1)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    api = FakeBotAPI(args.latency_ms, args.jitter_ms, args.flood_rate, args.retry_after, args.seed)
+    web.run_app(api.app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,173 @@
+"""Подготовка картинок для медиакарточек: уменьшение до размеров, которые показывает
+Telegram, пережатие под бюджет по байтам, без метаданных. Результат кладётся в кэш
+по хэшу исходника и параметров — повторный запуск ничего не пересчитывает.
+
+Без Pillow шаг пропускается, карточки уходят с исходными файлами.
+
+    python images.py img/*.jpg sport.jpg --max-side 1280 --quality 85 --max-kb 300
+"""
+import os
+import sys
+import hashlib
+import asyncio
+import logging
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:   # Pillow не обязателен
+    Image = ImageOps = None
+
+log = logging.getLogger(__name__)
+
+MIN_QUALITY = 60
+
+
+@dataclass(frozen=True)
+class Profile:
+    max_side: int = 1280        # Telegram показывает фото не крупнее 1280 по длинной стороне
+    quality: int = 85
+    max_bytes: int = 300 * 1024
+
+    def tag(self) -> str:
+        return f"{self.max_side}-{self.quality}-{self.max_bytes}"
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _digest(path: str, profile: Profile) -> str:
+    h = hashlib.sha1(profile.tag().encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def optimise(src: str, cache_dir: str, profile: Profile = Profile()) -> str:
+    """Путь к оптимизированной копии src (или сам src, если ужать не вышло). Работает в процессе пула."""
+    base = os.path.join(cache_dir, _digest(src, profile))
+    out, keep = base + ".jpg", base + ".keep"   # .keep — пустая отметка «ужать не вышло, отправляем src»
+    if os.path.exists(out):
+        return out
+    if os.path.exists(keep):
+        return src
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)       # поворот из EXIF применяем до того, как EXIF выбросить
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        im.thumbnail((profile.max_side, profile.max_side), Image.LANCZOS)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{out}.{os.getpid()}.tmp"
+        quality = profile.quality
+        while True:
+            im.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            if os.path.getsize(tmp) <= profile.max_bytes or quality <= MIN_QUALITY:
+                break
+            quality -= 5
+    if os.path.getsize(tmp) >= os.path.getsize(src):
+        os.remove(tmp)
+        open(keep, "wb").close()
+        return src
+    os.replace(tmp, out)
+    return out
+
+
+def _optimise_safe(src: str, cache_dir: str, profile: Profile) -> str:
+    try:
+        return optimise(src, cache_dir, profile)
+    except Exception as e:   # битая картинка не должна ронять старт — отдадим исходник
+        log.warning("image %s not optimised: %s", src, e)
+        return src
+
+
+async def prepare(paths: Iterable[str], cache_dir: str, profile: Profile = Profile(),
+                  workers: Optional[int] = None) -> Dict[str, str]:
+    """{исходный путь: путь к варианту для отправки}. Пересчёт — в пуле процессов, цикл событий не ждёт."""
+    paths = sorted(set(paths))
+    if not available():
+        log.info("Pillow not installed: media cards use original images")
+        return {p: p for p in paths}
+    if mp.current_process().daemon:   # воркер webhook: дочерние процессы ему заводить нельзя
+        results = [await asyncio.to_thread(_optimise_safe, p, cache_dir, profile) for p in paths]
+        return dict(zip(paths, results))
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1) or 1) as pool:
+        results = await asyncio.gather(*(loop.run_in_executor(pool, _optimise_safe, p, cache_dir, profile)
+                                         for p in paths))
+    return dict(zip(paths, results))
+
+
+Stamp = Optional[Tuple[int, int]]
+
+
+def _stamp(path: str) -> Stamp:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Variants:
+    """Исходный путь -> что отправлять. Вариант помнит mtime и размер исходника: если картинку
+    заменили на диске, get() отдаёт исходник, а новый вариант готовится в фоне."""
+
+    def __init__(self, cache_dir: str, profile: Profile = Profile()):
+        self.cache_dir = cache_dir
+        self.profile = profile
+        self._items: Dict[str, Tuple[Stamp, str]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def prepare(self, paths: Iterable[str]) -> int:
+        """Готовит варианты, которых нет или чей исходник изменился; сколько пересчитано."""
+        stale = {p: _stamp(p) for p in set(paths)}   # отметку берём до пересчёта: правка во время него не потеряется
+        stale = {p: st for p, st in stale.items() if p not in self._items or self._items[p][0] != st}
+        if not stale:
+            return 0
+        for src, out in (await prepare(stale, self.cache_dir, self.profile)).items():
+            self._items[src] = (stale[src], out)
+        return len(stale)
+
+    def get(self, path: str) -> str:
+        item = self._items.get(path)
+        if item is None:
+            return path
+        if item[0] == _stamp(path):
+            return item[1]
+        if path not in self._refreshing:
+            task = self._refreshing[path] = asyncio.create_task(self.prepare([path]))
+            task.add_done_callback(lambda _: self._refreshing.pop(path, None))
+        return path
+
+    def optimised(self) -> int:
+        return sum(src != out for src, (_, out) in self._items.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--cache-dir", default=os.getenv("IMG_CACHE_DIR", "data/img_cache"))
+    parser.add_argument("--max-side", type=int, default=Profile.max_side)
+    parser.add_argument("--quality", type=int, default=Profile.quality)
+    parser.add_argument("--max-kb", type=int, default=Profile.max_bytes // 1024)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if not available():
+        print("Pillow не установлен: pip install Pillow", file=sys.stderr)
+        return 1
+    profile = Profile(args.max_side, args.quality, args.max_kb * 1024)
+    variants = asyncio.run(prepare(args.paths, args.cache_dir, profile, args.workers))
+    for src, out in variants.items():
+        before, after = os.path.getsize(src), os.path.getsize(out)
+        print(f"{src}: {before // 1024} KB -> {after // 1024} KB" + ("" if out != src else " (оставлен исходник)"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,142 @@
 import os
+import html
+import time
 import asyncio
 import logging
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import List, Tuple, Optional, Sequence
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.filters import Command
 from aiogram.enums import ChatAction
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+)
 from aiogram.types import (
     InlineKeyboardButton, InlineKeyboardMarkup,
     ReplyKeyboardMarkup, KeyboardButton,
-    InputMediaPhoto, FSInputFile
+    InputMediaPhoto, InlineQueryResultArticle, InputTextMessageContent
 )
 
+from media_cache import MediaCache
+from bulk_delete import bulk_delete
+from deferred import DeferredDeleter
+from outbound import OutboundScheduler
+from registry import make_registry
+from screens import Screen, ScreenRegistry, card_fingerprint
+from teachers_index import TeacherIndex
+from content import ContentStore, ContentWatcher
+from coalesce import Coalescer
+from backpressure import UpdateLimiter
+from broadcast import Broadcaster, BroadcastBusy
+import images
+import metrics as metrics_mod
+from metrics import Metrics, ApiMetricsMiddleware, HandlerMetricsMiddleware, label_callback
+
 # ======================= БАЗА =======================
 logging.basicConfig(level=logging.INFO)
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7936690948:AAGbisw1Sc4CQxxR-208mIF-FVUiZalpoJs").strip()
 if not BOT_TOKEN or ":" not in BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN отсутствует или некорректен.")
-bot = Bot(token=BOT_TOKEN)
+# ---------- HTTP-сессия к Bot API: один пул соединений на процесс ----------
+BOT_API_BASE = os.getenv("BOT_API_BASE", "").strip()   # свой Bot API сервер / заглушка для замеров
+BOT_API_LOCAL = os.getenv("BOT_API_LOCAL", "") == "1"  # сервер запущен с --local: файлы берёт с диска
+BOT_API_LOCAL_ROOT = os.getenv("BOT_API_LOCAL_ROOT", "")  # где каталог бота виден серверу (если в другом контейнере)
+
+def build_session() -> AiohttpSession:
+    api = TelegramAPIServer.from_base(BOT_API_BASE, is_local=BOT_API_LOCAL) if BOT_API_BASE else PRODUCTION
+    session = AiohttpSession(api=api, timeout=float(os.getenv("TG_TIMEOUT", "30")))
+    # параметры TCPConnector: у AiohttpSession нет для них публичных аргументов
+    session._connector_init.update(
+        limit=int(os.getenv("TG_POOL_LIMIT", "100")),
+        limit_per_host=int(os.getenv("TG_POOL_PER_HOST", "0")),   # 0 — без отдельного лимита
+        keepalive_timeout=float(os.getenv("TG_KEEPALIVE", "60")),
+        ttl_dns_cache=300,
+    )
+    return session
+
+def local_file_uri(path: str) -> str:
+    full = os.path.abspath(path)
+    if BOT_API_LOCAL_ROOT:
+        full = os.path.join(BOT_API_LOCAL_ROOT, os.path.relpath(full, os.path.dirname(os.path.abspath(__file__))))
+    return f"file://{full}"
+
+bot = Bot(token=BOT_TOKEN, session=build_session())
 dp = Dispatcher()
 
-# ======================= УЧЁТ СООБЩЕНИЙ (in-memory) =======================
-_active_msg: dict[int, int] = {}     # «активная карточка» в чате (редактируем в неё)
-_registry: dict[int, list[int]] = {} # все сообщения бота (для /clear)
+# все вызовы Bot API идут через общую очередь: лимиты Telegram, приоритеты, повтор после 429
+outbound = OutboundScheduler(
+    global_rate=float(os.getenv("TG_GLOBAL_RPS", "30")),
+    chat_rate=float(os.getenv("TG_CHAT_RPS", "1")),
+    chat_burst=float(os.getenv("TG_CHAT_BURST", "3")),
+)
+bot.session.middleware(outbound)
+
+# метрики: хендлеры, колбэки, вызовы API (после очереди — чистое время запроса), фолбэки
+metrics = Metrics()
+bot.session.middleware(ApiMetricsMiddleware(metrics))
+for _observer in (dp.message, dp.callback_query, dp.inline_query):
+    _observer.middleware(HandlerMetricsMiddleware(metrics))
+# сколько обновлений обрабатывать разом (всего и на чат) и сколько держать в работе, прежде чем
+# перестать забирать новые; при очереди глубже UPDATES_SHED_DEPTH отложенные удаления ждут
+updates = UpdateLimiter(
+    metrics,
+    max_handlers=int(os.getenv("UPDATES_MAX_HANDLERS", "64")),
+    per_chat=int(os.getenv("UPDATES_PER_CHAT", "2")),
+    max_backlog=int(os.getenv("UPDATES_MAX_BACKLOG", "512")),
+    shed_depth=int(os.getenv("UPDATES_SHED_DEPTH", "128")),
+)
+dp.update.outer_middleware(updates)
+bot.session.middleware(updates.intake)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9102") or 0)   # 0 — не поднимать /metrics
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# file_id уже загруженных картинок: повторные показы не перезаливают файл
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "data/file_ids.json")
+media_cache = MediaCache(MEDIA_CACHE_PATH, namespace=BOT_TOKEN.split(":")[0],
+                         local_uri=local_file_uri if BOT_API_LOCAL else None)
+
+# отложенные удаления (команды пользователя, служебные сообщения): одна очередь, пачками по чатам
+deferred = DeferredDeleter(bot, os.getenv("DEFERRED_PATH", "data/deferred.json"), pressure=updates.deep)
+
+# картинки карточек пережимаются при старте (images.py); здесь — исходный путь -> что отправлять
+# (замена картинки на диске подхватывается: вариант пересчитывается)
+IMG_OPTIMIZE = os.getenv("IMG_OPTIMIZE", "1") == "1"
+IMG_CACHE_DIR = os.getenv("IMG_CACHE_DIR", "data/img_cache")
+IMG_PROFILE = images.Profile(
+    max_side=int(os.getenv("IMG_MAX_SIDE", "1280")),
+    quality=int(os.getenv("IMG_QUALITY", "85")),
+    max_bytes=int(os.getenv("IMG_MAX_KB", "300")) * 1024,
+)
+IMAGE_VARIANTS = images.Variants(IMG_CACHE_DIR, IMG_PROFILE)
+
+# подписчики (все, кто нажимал /start) и рассылки объявлений
+broadcasts = Broadcaster(
+    bot, os.getenv("BROADCAST_DB", "data/broadcast.sqlite3"),
+    rate=float(os.getenv("BROADCAST_RPS", "25")),   # чуть ниже глобального лимита — запас для ответов
+)
+
+# ======================= УЧЁТ СООБЩЕНИЙ =======================
+# «активная карточка» в чате (редактируем в неё) + журнал сообщений бота (для /clear)
+# REGISTRY_BACKEND: memory | sqlite
+registry = make_registry(
+    os.getenv("REGISTRY_BACKEND", "memory"),
+    os.getenv("REGISTRY_DB", "data/registry.sqlite3"),
+    cap=int(os.getenv("REGISTRY_CAP", "500")),
+)
 
-async def get_active_msg_id(chat_id: int) -> Optional[int]: return _active_msg.get(chat_id)
-async def set_active_msg_id(chat_id: int, mid: int): _active_msg[chat_id] = mid
-async def clear_active_msg_id(chat_id: int): _active_msg.pop(chat_id, None)
+async def get_active_msg_id(chat_id: int) -> Optional[int]: return await registry.get_active(chat_id)
+async def set_active_msg_id(chat_id: int, mid: int): await registry.set_active(chat_id, mid)
+async def clear_active_msg_id(chat_id: int): await registry.clear_active(chat_id)
 
-async def reg_push(chat_id: int, mid: int): _registry.setdefault(chat_id, []).append(mid)
-async def reg_get_all(chat_id: int) -> list[int]: return list(_registry.get(chat_id, []))
-async def reg_clear(chat_id: int): _registry.pop(chat_id, None)
+async def reg_push(chat_id: int, mid: int): await registry.push(chat_id, mid)
+async def reg_get_all(chat_id: int) -> list[int]: return [mid for mid, _ in await registry.get_all(chat_id)]
+async def reg_get_all_dated(chat_id: int) -> list[tuple[int, float]]: return await registry.get_all(chat_id)
+async def reg_clear(chat_id: int): await registry.clear(chat_id)
 
 async def delete_safe(chat_id: int, message_id: int):
     try:
@@ -39,8 +145,13 @@ async def delete_safe(chat_id: int, message_id: int):
         pass
 
 async def think(chat_id: int, delay: float = 0.1):
+    started = time.perf_counter()
     await bot.send_chat_action(chat_id, ChatAction.TYPING)
     await asyncio.sleep(delay)
+    metrics.observe("think_seconds", time.perf_counter() - started, "think(): chat action + pause")
+
+def count_fallback(path: str, reason: str):
+    metrics.inc("fallbacks_total", help_="Edits that fell back to sending a new card", path=path, reason=reason)
 
 # ======================= UI-ХЕЛПЕРЫ =======================
 def section(title: str, lines: Sequence[str], footer: Optional[str] = None) -> str:
@@ -59,139 +170,155 @@ def grid(buttons: List[Tuple[str, str, str]], per_row: int = 2) -> InlineKeyboar
     rows = [ _row(buttons[i:i+per_row]) for i in range(0, len(buttons), per_row) ]
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-async def send_card(chat_id: int, text_html: str, kb: Optional[InlineKeyboardMarkup] = None) -> types.Message:
+# Ответы Bot API на правку, которые означают не ошибку, а конкретную ситуацию
+_NOT_MODIFIED = ("message is not modified",)
+_GONE = ("message to edit not found", "message not found", "message_id_invalid")
+_WRONG_KIND = ("there is no text in the message", "there is no media in the message",
+               "there is no caption in the message", "message can't be edited")
+
+async def try_edit(chat_id: int, mid: int, fp: str, edit, photo: bool = False) -> str:
+    """Правит карточку, если показано не то же самое. Возвращает:
+    "done"    — на экране нужное (в т.ч. правка не понадобилась);
+    "gone"    — сообщения больше нет: шлём новое;
+    "replace" — это сообщение так не поправить (текст<->фото, старше 48 ч): удаляем и шлём новое;
+    "skip"    — флуд-лимит или сеть: повторно не шлём, чтобы не плодить дубли."""
+    if await registry.get_fingerprint(chat_id, mid) == fp:
+        metrics.inc("edits_skipped_total", help_="Edits skipped: content unchanged")
+        return "done"
+    try:
+        await edit()
+    except TelegramBadRequest as e:
+        text = str(e).lower()
+        if not any(m in text for m in _NOT_MODIFIED):
+            if any(m in text for m in _GONE):
+                return "gone"
+            if any(m in text for m in _WRONG_KIND):
+                return "replace"
+            raise
+    except (TelegramRetryAfter, TelegramNetworkError, TelegramServerError) as e:
+        logging.warning("edit chat=%s mid=%s not applied: %s", chat_id, mid, e)
+        return "skip"
+    await registry.set_fingerprint(chat_id, mid, fp, photo)
+    return "done"
+
+async def send_card(chat_id: int, text_html: str, kb: Optional[InlineKeyboardMarkup] = None,
+                    fp: Optional[str] = None) -> types.Message:
+    """fp — готовый card_fingerprint (у Screen он посчитан заранее)."""
     await think(chat_id)
     msg = await bot.send_message(chat_id, text_html, parse_mode="HTML", disable_web_page_preview=True, reply_markup=kb)
     await reg_push(chat_id, msg.message_id)
     await set_active_msg_id(chat_id, msg.message_id)
+    await registry.set_fingerprint(chat_id, msg.message_id, fp or card_fingerprint(text_html, kb))
     return msg
 
-async def edit_card(msg: types.Message, text_html: str, kb: Optional[InlineKeyboardMarkup] = None):
-    return await msg.edit_text(text_html, parse_mode="HTML", disable_web_page_preview=True, reply_markup=kb)
-
 async def send_media_card(chat_id: int, image_path: str, caption_html: str,
-                          kb: Optional[InlineKeyboardMarkup] = None) -> types.Message:
+                          kb: Optional[InlineKeyboardMarkup] = None, fp: Optional[str] = None) -> types.Message:
+    fp = fp or card_fingerprint(caption_html, kb, image_path)   # по исходной картинке: вариант — та же картинка
+    image_path = IMAGE_VARIANTS.get(image_path)
     await think(chat_id)
-    msg = await bot.send_photo(chat_id, FSInputFile(image_path), caption=caption_html, parse_mode="HTML", reply_markup=kb)
+    msg = await media_cache.upload(image_path, lambda media: bot.send_photo(
+        chat_id, media, caption=caption_html, parse_mode="HTML", reply_markup=kb))
     await reg_push(chat_id, msg.message_id)
     await set_active_msg_id(chat_id, msg.message_id)
+    await registry.set_fingerprint(chat_id, msg.message_id, fp, photo=True)
     return msg
 
-async def edit_media_or_send_new(msg: types.Message, image_path: str, caption_html: str,
-                                 kb: Optional[InlineKeyboardMarkup] = None):
-    """Если msg — медиа, меняем картинку+подпись; если текст — удаляем и шлём медиакарточку."""
-    try:
-        media = InputMediaPhoto(media=FSInputFile(image_path), caption=caption_html, parse_mode="HTML")
-        await msg.edit_media(media=media, reply_markup=kb)
-    except Exception:
-        await delete_safe(msg.chat.id, msg.message_id)
-        await send_media_card(msg.chat.id, image_path, caption_html, kb)
-
-async def edit_text_or_send_new(msg: types.Message, text_html: str,
-                                kb: Optional[InlineKeyboardMarkup] = None):
+async def _resend(chat_id: int, mid: int, outcome: str, path: str, send):
+    count_fallback(path, outcome)
+    if outcome == "replace":
+        await delete_safe(chat_id, mid)
+    await send()
+
+async def edit_media_or_send_new(chat_id: int, mid: int, photo: Optional[bool], image_path: str, caption_html: str,
+                                 kb: Optional[InlineKeyboardMarkup] = None, fp: Optional[str] = None):
+    """Если карточка mid — медиа, меняем картинку+подпись; если текст — удаляем и шлём медиакарточку.
+    photo=None — вид карточки неизвестен: пробуем править, неподходящую Telegram отвергнет."""
+    fp = fp or card_fingerprint(caption_html, kb, image_path)
+    if photo is False:
+        outcome = "replace"   # текст в фото не превратить — сразу, без заведомо неудачной правки
+    else:
+        variant = IMAGE_VARIANTS.get(image_path)
+        outcome = await try_edit(chat_id, mid, fp,
+                                 lambda: media_cache.upload(variant, lambda media: bot.edit_message_media(
+                                     chat_id=chat_id, message_id=mid,
+                                     media=InputMediaPhoto(media=media, caption=caption_html, parse_mode="HTML"),
+                                     reply_markup=kb)), photo=True)
+    if outcome not in ("done", "skip"):
+        await _resend(chat_id, mid, outcome, "edit_media",
+                      lambda: send_media_card(chat_id, image_path, caption_html, kb, fp))
+
+async def edit_text_or_send_new(chat_id: int, mid: int, photo: Optional[bool], text_html: str,
+                                kb: Optional[InlineKeyboardMarkup] = None, fp: Optional[str] = None):
     """Безопасное возвращение к текстовой карточке (например, по «Назад»)."""
-    try:
-        await msg.edit_text(text_html, parse_mode="HTML", disable_web_page_preview=True, reply_markup=kb)
-    except Exception:
-        await delete_safe(msg.chat.id, msg.message_id)
-        await send_card(msg.chat.id, text_html, kb)
-
-# ======================= ТЕКСТЫ =======================
-WELCOME_TEXT = (
-    "<b>Привет! 👋</b>\n\n"
-    "Я твой ассистент в СПбГУ.\n\n"
-    "Помогу с расписанием, расскажу про студклубы, дам полезные ссылки и контакты. 👇"
-)
-LAUNDRY_TEXT_HTML = (
-    "🧺 <b>Прачка СПбГУ</b>\n\n"
-    "1) <a href=\"https://docs.google.com/spreadsheets/d/1P0C0cLeAVVUPPkjjJ2KXgWVTPK4TEX6aqUblOCUnepI/edit?usp=sharing\">Первый корпус</a>\n"
-    "2) <a href=\"https://docs.google.com/spreadsheets/d/1ztCbv9GyKyNQe5xruOHнНLVwNPLXOcm9MmYw2nP5kU/edit?usp=drivesdk\">Второй корпус</a>\n"
-    "3) <a href=\"https://docs.google.com/spreadsheets/d/1xiEC3lD5_9b9Hubot1YH5m7_tOsqMjL39ZIzUtuWffk/edit?usp=sharing\">Третий корпус</a>\n"
-    "4) <a href=\"https://docs.google.com/spreadsheets/d/1D-EFVHeAd44Qe7UagronhSF5NS4dP76Q2_CnX1wzQis/edit\">Четвертый корпус</a>\n"
-    "5) <a href=\"https://docs.google.com/spreadsheets/d/1XFIQ6GCSрwcBd4FhhJpY897udcCKx6кzOZoTXдCjqhI/edit?usp=sharing\">Пятый корпус</a>\n"
-    "6) <a href=\"https://docs.google.com/spreadsheets/d/140z6wAzC4QR3SKVec7QLJIZp4CHfNacVDFoIZcov1aI/edit?usp=sharing\">Шестой корпус</a>\n"
-    "7) <a href=\"https://docs.google.com/spreadsheets/d/197PG09l5Tl9PkGJo2zqySbOTKdmcF_2mO4D_VTMrSa4/edit?usp=drivesdk\">Седьмой корпус</a>\n"
-    "8) <a href=\"https://docs.google.com/spreadsheets/d/1EBvaLpxAK5r91yc-jaCa8bj8iLumwJvGFjTDlEArRLA/edit?usp=sharing\">Восьмой корпус</a>\n"
-    "9) <a href=\"https://docs.google.com/spreadsheets/d/1wGxLQLF5X22JEqMlq0mSVXMyrMQslXbemo-Z8YQcSS8/edit?usp=sharing\">Девятый корпус</a>"
-)
-WATER_TEXT_HTML = section("🚰 Вода", ["Пишите в группу в <a href=\"https://chat.whatsapp.com/BUtruTEY8pvL9Ryh5TcaLw?mode=ems_copy_t\">Whatsapp</a>"])
-LOST_TEXT_HTML  = section("🔎 Потеряшки СПбГУ", [
-    "Группа для поиска потерянных вещей и возврата владельцам.",
-    "Если что-то потерял или нашёл — напиши сюда!",
-    "📲 <a href='https://t.me/+CzTrsVUbavM5YzNi'>Перейти в Telegram-группу</a>"
-])
-
-# ======================= ✅ ADMIN: КОНТАКТЫ АДМИНИСТРАЦИИ =======================
-ADMIN_CONTACTS_HTML = section(  # ✅ ADMIN
-    "📞 Контактные данные сотрудников администрации ВШМ СПбГУ (актуальные на 2025 год)",
-    [
-        "• <b>Дельник Светлана Львовна</b> — начальник службы обеспечения программ бакалавриата, <b>delnik@gsom.spbu.ru</b>",
-        "• <b>Смородинцева Аурелия Дмитриевна</b> — заместитель начальника Управления кадров Главного управления по организации работы с персоналом СПбГУ, <b>a.smorodintseva@spbu.ru</b>",
-        "• <b>Волохов Богдан Алексеевич</b> — заведующий хозяйством, <b>b.volokhov@gsom.spbu.ru</b> (общий адрес отдела: <b>aho@spbu.ru</b>)",
+    fp = fp or card_fingerprint(text_html, kb)
+    if photo:
+        outcome = "replace"
+    else:
+        outcome = await try_edit(chat_id, mid, fp, lambda: bot.edit_message_text(
+            chat_id=chat_id, message_id=mid, text=text_html, parse_mode="HTML",
+            disable_web_page_preview=True, reply_markup=kb))
+    if outcome not in ("done", "skip"):
+        await _resend(chat_id, mid, outcome, "edit_text", lambda: send_card(chat_id, text_html, kb, fp))
+
+# ======================= КОНТЕНТ (content/*.json) =======================
+# тексты разделов, контакты, преподаватели и клубы лежат в файлах; правка файла подхватывается
+# на лету (ContentWatcher): пересобираются только изменившиеся разделы, экраны подменяются целиком
+CONTENT = ContentStore(os.getenv("CONTENT_DIR", "content"))
+CONTENT.load_all()
+
+def card_html(card: dict) -> str:
+    return card["html"] if "html" in card else section(card["title"], card["lines"], card.get("footer"))
+
+@dataclass(frozen=True)
+class CompiledContent:
+    """Контент, готовый к показу. Хендлеры читают его из CONTENT_VIEW, apply_content подменяет целиком."""
+    welcome_html: str
+    laundry_html: str
+    water_html: str
+    lost_html: str
+    admin_contacts_html: str
+    teachers: List[str]
+    teacher_index: TeacherIndex                          # поиск по /find и inline-режиму
+    inline_results: List[InlineQueryResultArticle]       # готовые inline-результаты, по номеру в teachers
+    clubs: List[Tuple[str, str, str]]                    # (callback_data, картинка, подпись)
+    studclubs_keyboard: InlineKeyboardMarkup
+
+def compile_texts(raw: dict) -> dict:
+    return {"welcome_html": card_html(raw["welcome"]), "laundry_html": card_html(raw["laundry"]),
+            "water_html": card_html(raw["water"]), "lost_html": card_html(raw["lost"])}
+
+def compile_admin_contacts(raw: dict) -> dict:
+    return {"admin_contacts_html": card_html(raw)}
+
+def compile_teachers(raw: List[str]) -> dict:
+    index = TeacherIndex(raw)
+    inline_results = [
+        InlineQueryResultArticle(
+            id=str(i), title=t.name, description=", ".join(filter(None, [t.position, t.email])),
+            input_message_content=InputTextMessageContent(message_text=t.line),
+        )
+        for i, t in enumerate(index.teachers)
     ]
-)
+    return {"teachers": list(raw), "teacher_index": index, "inline_results": inline_results}
+
+def compile_clubs(raw: List[dict]) -> dict:
+    return {"clubs": [(c["key"], c["image"], c["caption"]) for c in raw],
+            "studclubs_keyboard": grid([(c["title"], "cb", c["key"]) for c in raw] + [("⬅️ Назад", "cb", "back_main")],
+                                       per_row=2)}
+
+COMPILERS = {"texts": compile_texts, "admin_contacts": compile_admin_contacts,
+             "teachers": compile_teachers, "clubs": compile_clubs}
+
+def compile_sections(sections: dict, base: Optional[CompiledContent] = None) -> CompiledContent:
+    """Собирает разделы; с base — только переданные, остальное берётся из base."""
+    fields = {}
+    for name, raw in sections.items():
+        fields.update(COMPILERS[name](raw))
+    return replace(base, **fields) if base is not None else CompiledContent(**fields)
+
+CONTENT_VIEW = compile_sections(CONTENT.data)
 
-# ======================= ПРЕПОДАВАТЕЛИ (лист + пагинация) =======================
-TEACHERS = [
-    "Алканова Ольга Николаевна — доцент кафедры маркетинга, alkanova@gsom.spbu.ru",
-    "Андрианов Александр Юрьевич — доцент кафедры финансов и учета, a.y.andrianov@gsom.spbu.ru",
-    "Арай Юлия Николаевна — доцент кафедры стратегического и международного менеджмента, aray_yulia@gsom.spbu.ru",
-    "Арзуманян Максим Юрьевич — старший преподаватель кафедры информационных технологий в менеджменте, arzumanyan@gsom.spbu.ru",
-    "Бейсенбаев Руслан Маратович — ассистент кафедры операционного менеджмента, beysenbaev@gsom.spbu.ru",
-    "Благов Евгений Юрьевич — доцент кафедры государственного и муниципального управления, blagove@gsom.spbu.ru",
-    "Благов Юрий Евгеньевич — доцент кафедры стратегического и международного менеджмента, blagov@gsom.spbu.ru",
-    "Богатырева Карина Александровна — доцент кафедры стратегического и международного менеджмента, bogatyreva@gsom.spbu.ru",
-    "Бордунос Александра Константиновна — старший преподаватель кафедры организационного поведения и управления персоналом, a.bordunos@gsom.spbu.ru",
-    "Верховская Ольга Рафаиловна — доцент кафедры стратегического и международного менеджмента, verkhovskaya@gsom.spbu.ru",
-    "Вукович Дарко Б. — доцент кафедры финансов и учета, d.vukovic@gsom.spbu.ru",
-    "Гаврилова Татьяна Альбертовна — профессор кафедры информационных технологий в менеджменте, gavrilova@gsom.spbu.ru",
-    "Гаранина Ольга Леонидовна — доцент кафедры стратегического и международного менеджмента, o.garanina@gsom.spbu.ru",
-    "Гиленко Евгений Валерьевич — доцент кафедры государственного и муниципального управления, e.gilenko@gsom.spbu.ru",
-    "Гладких Игорь Валентинович — доцент кафедры маркетинга, gladkikh@gsom.spbu.ru",
-    "Голубева Анастасия Алексеевна — доцент кафедры государственного и муниципального управления, golubeva@gsom.spbu.ru",
-    "Горовой Владимир Андреевич — старший преподаватель кафедры информационных технологий в менеджменте, vladimir.gorovoy@gsom.spbu.ru",
-    "Денисов Александр Федорович — доцент кафедры организационного поведения и управления персоналом, denisov@gsom.spbu.ru",
-    "Дергунова Ольга Константиновна — директор ВШМ СПбГУ, officedergunova@gsom.spbu.ru",
-    "Дмитриева Диана Михайловна — доцент кафедры стратегического и международного менеджмента, d.dmitrieva@gsom.spbu.ru",
-    "Дроздова Наталья Петровна — старший преподаватель кафедры государственного и муниципального управления, n.drozdova@gsom.spbu.ru",
-    "Ермолаева Любовь Андреевна — доцент кафедры стратегического и международного менеджмента, l.a.ermolaeva@gsom.spbu.ru",
-    "Завьялова Елена Кирилловна — профессор кафедры организационного поведения и управления персоналом, zavyalova@gsom.spbu.ru",
-    "Замулин Андрей Леонидович — старший преподаватель кафедры организационного поведения и управления персоналом, zamulin@gsom.spbu.ru",
-    "Зенкевич Николай Анатольевич — доцент кафедры операционного менеджмента, zenkevich@gsom.spbu.ru",
-    "Зятчин Андрей Васильевич — старший преподаватель кафедры операционного менеджмента, zyatchin@gsom.spbu.ru",
-    "Иванов Андрей Евгеньевич — доцент кафедры государственного и муниципального управления, ivanov@gsom.spbu.ru",
-    "Ильина Юлия Борисовна — доцент кафедры финансов и учета, j.ilina@gsom.spbu.ru",
-    "Кирюков Сергей Игоревич — старший преподаватель кафедры маркетинга, kiryukov@gsom.spbu.ru",
-    "Клемина Татьяна Николаевна — старший преподаватель кафедры стратегического и международного менеджмента, klemina@gsom.spbu.ru",
-    "Клишевич Дарья Сергеевна — ассистент кафедры стратегического и международного менеджмента, d.klishevich@gsom.spbu.ru",
-    "Комаров Сергей Сергеевич — старший преподаватель кафедры государственного и муниципального управления, komarov@gsom.spbu.ru",
-    "Кошелева Софья Владимировна — профессор кафедры организационного поведения и управления персоналом, kosheleva@gsom.spbu.ru",
-    "Кучеров Дмитрий Геннадьевич — доцент кафедры организационного поведения и управления персоналом, kucherov@gsom.spbu.ru",
-    "Ласковая Анастасия Кирилловна — доцент кафедры стратегического и международного менеджмента, a.laskovaya@gsom.spbu.ru",
-    "Латуха Марина Олеговна — профессор кафедры организационного поведения и управления персоналом, marina.latuha@gsom.spbu.ru",
-    "Лещева Ирина Анатольевна — доцент кафедры информационных технологий в менеджменте, leshcheva@gsom.spbu.ru",
-    "Назаренко Екатерина Андреевна — ассистент (ВШМ СПбГУ), nazarenko@gsom.spbu.ru",
-    "Никифорова Ольга Александровна — доцент кафедры организационного поведения и управления персоналом, o.nikiforova@gsom.spbu.ru",
-    "Никулин Егор Дмитриевич — доцент кафедры финансов и учета, nikulin@gsom.spbu.ru",
-    "Окулов Виталий Леонидович — старший преподаватель кафедры финансов и учета, okulov@gsom.spbu.ru",
-    "Панибратов Андрей Юрьевич — профессор кафедры стратегического и международного менеджмента, panibratov@gsom.spbu.ru",
-    "Ринкон Эрнандес Карлос Хоакин — старший преподаватель кафедры финансов и учета, c.rincon@gsom.spbu.ru",
-    "Рогова Елена Моисеевна — профессор кафедры финансов и учета, e.rogova@gsom.spbu.ru",
-    "Ручьёва Алина Сергеевна — ассистент кафедры маркетинга, rucheva@gsom.spbu.ru",
-    "Скляр Татьяна Моисеевна — старший преподаватель кафедры государственного и муниципального управления, sklyar@gsom.spbu.ru",
-    "Смара Рафик — ассистент (ВШМ СПбГУ), r.smara@gsom.spbu.ru",
-    "Смирнов Марат Владимирович — доцент кафедры финансов и учета, m.v.smirnov@gsom.spbu.ru",
-    "Смирнова Мария Михайловна — доцент кафедры маркетинга, smirnova@gsom.spbu.ru",
-    "Станко Татьяна Сергеевна — доцент кафедры операционного менеджмента, t.stanko@gsom.spbu.ru",
-    "Старов Сергей Александрович — старший преподаватель кафедры стратегического и международного менеджмента, starov@gsom.spbu.ru",
-    "Старшов Егор Дмитриевич — ассистент кафедры государственного и муниципального управления, e.starshov@gsom.spbu.ru",
-    "Страхович Эльвира Витаутасовна — доцент кафедры информационных технологий в менеджменте, e.strakhovich@spbu.ru",
-    "Федотов Юрий Васильевич — доцент кафедры операционного менеджмента, fedotov@gsom.spbu.ru",
-    "Христодоулоу Иоаннис — доцент кафедры стратегического и международного менеджмента, контакт не найден",
-    "Цыбова Виктория Сергеевна — доцент кафедры организационного поведения и управления персоналом, tsybova@gsom.spbu.ru",
-    "Черенков Виталий Иванович — профессор кафедры маркетинга, cherenkov@gsom.spbu.ru",
-    "Шарахин Павел Сергеевич — доцент кафедры операционного менеджмента, p.sharakhin@gsom.spbu.ru",
-]
+# ======================= ПРЕПОДАВАТЕЛИ (пагинация) =======================
 TEACHERS_PER_PAGE = 15
 
 def teachers_page_kb(page: int, total_pages: int) -> InlineKeyboardMarkup:
@@ -207,16 +334,34 @@ def teachers_page_kb(page: int, total_pages: int) -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton(text="⬅️ В Контакты", callback_data="contacts")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-def get_teachers_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-    total_pages = (len(TEACHERS) + TEACHERS_PER_PAGE - 1) // TEACHERS_PER_PAGE
+def get_teachers_page(page: int, teachers: Optional[Sequence[str]] = None) -> tuple[str, InlineKeyboardMarkup]:
+    teachers = CONTENT_VIEW.teachers if teachers is None else teachers
+    total_pages = (len(teachers) + TEACHERS_PER_PAGE - 1) // TEACHERS_PER_PAGE
     page = max(1, min(page, total_pages))
     start = (page - 1) * TEACHERS_PER_PAGE
     end = start + TEACHERS_PER_PAGE
-    items = TEACHERS[start:end]
+    items = teachers[start:end]
     text = "<b>Преподаватели бакалавриата и магистратуры ВШМ СПбГУ:</b>\n\n" + "\n".join(items) + f"\n\nСтраница {page}/{total_pages}"
     kb = teachers_page_kb(page, total_pages)
     return text, kb
 
+# ======================= ПОИСК ПРЕПОДАВАТЕЛЕЙ =======================
+# /find <фамилия | кафедра | почта> и inline-режим (@бот запрос; включается в @BotFather → /setinline)
+# индекс и готовые inline-результаты собираются вместе со списком (compile_teachers)
+FIND_LIMIT = 20
+INLINE_PAGE = 50           # максимум результатов на один answerInlineQuery
+INLINE_CACHE_TIME = 300    # Telegram сам отдаёт повторные запросы из кэша столько секунд
+
+@lru_cache(maxsize=256)
+def find_teachers_text(query: str) -> str:
+    found = CONTENT_VIEW.teacher_index.search(query)
+    title = f"🔎 Поиск: {html.escape(query)}"
+    if not found:
+        return section(title, ["Никого не нашёл. Попробуй начало фамилии, кафедру или часть почты."])
+    lines = [t.line for t in found[:FIND_LIMIT]]
+    footer = f"…и ещё {len(found) - FIND_LIMIT}. Уточни запрос." if len(found) > FIND_LIMIT else None
+    return section(title, lines, footer)
+
 # ======================= КЛАВИАТУРЫ =======================
 REPLY_START_BTN = "Запуск бота"
 reply_keyboard = ReplyKeyboardMarkup(
@@ -238,15 +383,7 @@ menu_keyboard = grid([
     ("⬅️ Назад",     "cb", "back_main"),
 ], per_row=2)
 
-studclubs_keyboard = grid([
-    ("CASE Club",            "cb", "case_club"),
-    ("КБК",                  "cb", "kbk"),
-    ("Falcon Business Club", "cb", "falcon"),
-    ("MCW",                  "cb", "MCW"),
-    ("SPbU Golden Cube",       "cb", "cube"),
-    ("Sport and Culture",    "cb", "sport_culture"),
-    ("⬅️ Назад",             "cb", "back_main"),
-], per_row=2)
+back_to_contacts_keyboard = grid([("⬅️ В Контакты", "cb", "contacts")], per_row=1)
 
 contacts_keyboard = grid([
     ("👩‍🏫 Преподаватели", "cb", "contact_teachers"),
@@ -259,43 +396,67 @@ contacts_keyboard = grid([
 async def show_card_exclusive(chat_id: int, text_html: str, kb: Optional[InlineKeyboardMarkup] = None):
     prev = await get_active_msg_id(chat_id)
     if prev:
-        try:
-            await bot.edit_message_text(chat_id=chat_id, message_id=prev,
-                                        text=text_html, parse_mode="HTML",
-                                        disable_web_page_preview=True, reply_markup=kb)
+        if await registry.is_photo(chat_id, prev):
+            outcome = "replace"   # медиакарточку в текст не поправить
+        else:
+            outcome = await try_edit(chat_id, prev, card_fingerprint(text_html, kb), lambda: bot.edit_message_text(
+                chat_id=chat_id, message_id=prev, text=text_html, parse_mode="HTML",
+                disable_web_page_preview=True, reply_markup=kb))
+        if outcome in ("done", "skip"):
             return
-        except Exception:
+        count_fallback("show_card_exclusive", outcome)
+        if outcome == "replace":
             await delete_safe(chat_id, prev)
-            await clear_active_msg_id(chat_id)
+        await clear_active_msg_id(chat_id)
     await send_card(chat_id, text_html, kb)
 
 # ======================= КОМАНДЫ =======================
-async def schedule_delete(chat_id: int, message_id: int, delay: float):
-    try:
-        await asyncio.sleep(delay); await bot.delete_message(chat_id, message_id)
-    except Exception:
-        pass
+HELP_TEXT_HTML = section("❓ Помощь", [
+    "Навигация через кнопки под сообщениями.",
+    "Команды: /start — перезапуск, /menu — открыть меню, /find — поиск преподавателя, /help — помощь.",
+    f"Reply-кнопка «{REPLY_START_BTN}» — быстрый возврат к началу.",
+    "Ссылки в карточках кликабельны."
+])
+MENU_CMD_TEXT_HTML = section("📖 Меню", ["Выбери нужный раздел ниже 👇"])
+
+def schedule_delete(chat_id: int, message_id: int, delay: float):
+    deferred.schedule(chat_id, message_id, delay)
+
+_background: set = set()   # ссылки на фоновые задачи, чтобы их не собрал GC
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
 
 @dp.message(Command("help"))
 async def help_handler(message: types.Message):
-    asyncio.create_task(schedule_delete(message.chat.id, message.message_id, 0.8))
-    txt = section("❓ Помощь", [
-        "Навигация через кнопки под сообщениями.",
-        "Команды: /start — перезапуск, /menu — открыть меню, /help — помощь.",
-        f"Reply-кнопка «{REPLY_START_BTN}» — быстрый возврат к началу.",
-        "Ссылки в карточках кликабельны."
-    ])
-    await show_card_exclusive(message.chat.id, txt, main_keyboard)
+    schedule_delete(message.chat.id, message.message_id, 0.8)
+    await show_card_exclusive(message.chat.id, HELP_TEXT_HTML, main_keyboard)
 
 @dp.message(Command("menu"))
 async def menu_handler(message: types.Message):
-    asyncio.create_task(schedule_delete(message.chat.id, message.message_id, 0.8))
-    await show_card_exclusive(message.chat.id, section("📖 Меню", ["Выбери нужный раздел ниже 👇"]), menu_keyboard)
+    schedule_delete(message.chat.id, message.message_id, 0.8)
+    await show_card_exclusive(message.chat.id, MENU_CMD_TEXT_HTML, menu_keyboard)
+
+@dp.message(Command("find"))
+async def find_handler(message: types.Message):
+    schedule_delete(message.chat.id, message.message_id, 0.8)
+    query = (message.text or "").partition(" ")[2].strip()
+    if not query:
+        txt = section("🔎 Поиск преподавателя", [
+            "Напиши после команды начало фамилии, кафедру или часть почты.",
+            "Например: /find смирн, /find маркетинг, /find vukovic",
+        ])
+    else:
+        txt = find_teachers_text(query)
+    await show_card_exclusive(message.chat.id, txt, back_to_contacts_keyboard)
 
 @dp.message(Command(commands=["start", "старт"]))
 async def start_handler(message: types.Message):
-    asyncio.create_task(schedule_delete(message.chat.id, message.message_id, 0.8))
-    await show_card_exclusive(message.chat.id, WELCOME_TEXT, main_keyboard)
+    schedule_delete(message.chat.id, message.message_id, 0.8)
+    await broadcasts.subscribe(message.chat.id)
+    await show_card_exclusive(message.chat.id, CONTENT_VIEW.welcome_html, main_keyboard)
     # маленький плейсхолдер ради reply-клавиатуры (как раньше)
     ph = await bot.send_message(message.chat.id, " ", reply_markup=reply_keyboard)
     await reg_push(message.chat.id, ph.message_id)
@@ -303,135 +464,286 @@ async def start_handler(message: types.Message):
 @dp.message(Command("clear"))
 async def clear_handler(message: types.Message):
     chat_id = message.chat.id
-    asyncio.create_task(schedule_delete(chat_id, message.message_id, 1.0))
+    confirm = await bot.send_message(chat_id, "🧹 Очищаю всё…")
     async def nuke():
         await asyncio.sleep(0.4)
-        ids = set(await reg_get_all(chat_id))
+        items: dict[int, Optional[float]] = dict(await reg_get_all_dated(chat_id))
         active_id = await get_active_msg_id(chat_id)
         if active_id:
-            ids.add(active_id)
-        for mid in ids:
-            await delete_safe(chat_id, mid)
+            items.setdefault(active_id, None)
+        items[message.message_id] = message.date.timestamp()  # сама команда уходит той же пачкой
+        items.pop(confirm.message_id, None)
+        report = await bulk_delete(bot, chat_id, items.items())
+        logging.info("/clear chat=%s: %s", chat_id, report)
         await reg_clear(chat_id)
         await clear_active_msg_id(chat_id)
-    asyncio.create_task(nuke())
-    confirm = await bot.send_message(chat_id, "🧹 Очищаю всё…")
-    await reg_push(chat_id, confirm.message_id)
-    asyncio.create_task(schedule_delete(chat_id, confirm.message_id, 1.0))
+        await reg_push(chat_id, confirm.message_id)
+        try:
+            await bot.edit_message_text(f"🧹 Удалено сообщений: {report.deleted} за {report.elapsed:.1f} с",
+                                        chat_id=chat_id, message_id=confirm.message_id)
+        except Exception:
+            pass
+        schedule_delete(chat_id, confirm.message_id, 1.5)
+    spawn(nuke())
 
 @dp.message(F.text == REPLY_START_BTN)
 async def reply_start_handler(message: types.Message):
-    asyncio.create_task(schedule_delete(message.chat.id, message.message_id, 0.3))
-    await show_card_exclusive(message.chat.id, WELCOME_TEXT, main_keyboard)
+    schedule_delete(message.chat.id, message.message_id, 0.3)
+    await broadcasts.subscribe(message.chat.id)
+    await show_card_exclusive(message.chat.id, CONTENT_VIEW.welcome_html, main_keyboard)
     ph = await bot.send_message(message.chat.id, " ", reply_markup=reply_keyboard)
     await reg_push(message.chat.id, ph.message_id)
 
-# ======================= КОЛБЭКИ =======================
-@dp.callback_query()
-async def callback_handler(cb: types.CallbackQuery):
-    data = cb.data
-    msg  = cb.message
-
-    # --- текстовые разделы: безопасный переход к тексту ---
-    if data == "studclubs":
-        await edit_text_or_send_new(msg, section("🎭 Студклубы", ["Выбери клуб ниже 👇"]), studclubs_keyboard)
-    elif data == "menu":
-        await edit_text_or_send_new(msg, section("📖 Меню", ["Выбери нужный раздел 👇"]), menu_keyboard)
-    elif data == "back_main":
-        await edit_text_or_send_new(msg, WELCOME_TEXT, main_keyboard)
-    elif data == "laundry":
-        await edit_text_or_send_new(msg, LAUNDRY_TEXT_HTML, menu_keyboard)
-    elif data == "water":
-        await edit_text_or_send_new(msg, WATER_TEXT_HTML, menu_keyboard)
-    elif data == "lost":
-        await edit_text_or_send_new(msg, LOST_TEXT_HTML, menu_keyboard)
+# ======================= ЭКРАНЫ =======================
+# Всё, что показывают кнопки, собирается заранее: callback_data -> карточка.
+# c — скомпилированный контент; при горячей перезагрузке сюда приходит новая версия
+def build_screens(c: CompiledContent) -> ScreenRegistry:
+    screens = ScreenRegistry()
+    # --- текстовые разделы ---
+    screens.add("studclubs", Screen(section("🎭 Студклубы", ["Выбери клуб ниже 👇"]), c.studclubs_keyboard))
+    screens.add("menu",      Screen(section("📖 Меню", ["Выбери нужный раздел 👇"]), menu_keyboard))
+    screens.add("back_main", Screen(c.welcome_html, main_keyboard))
+    screens.add("laundry",   Screen(c.laundry_html, menu_keyboard))
+    screens.add("water",     Screen(c.water_html, menu_keyboard))
+    screens.add("lost",      Screen(c.lost_html, menu_keyboard))
 
     # ==== клубы: медиакарточки (картинка + подпись) ====
-    elif data == "case_club":
-        await edit_media_or_send_new(
-            msg,
-            image_path="img/CaseClub.jpg",
-            caption_html="<a href='https://t.me/gsomspbucaseclub'><b>Перейти в Telegram</b></a>",
-            kb=studclubs_keyboard
-        )
-    elif data == "cube":
-        await edit_media_or_send_new(
-            msg,
-            image_path="img/cube.jpg",
-            caption_html="<a href='https://t.me/mafia_gsom'><b>Перейти в Telegram</b></a>",
-            kb=studclubs_keyboard
-        )  
-    elif data == "sport_culture":
-        await edit_media_or_send_new(
-            msg,
-            image_path="sport.jpg",
-            caption_html="<a href='https://t.me/gsomsport'><b>Перейти в Telegram</b></a>",
-            kb=studclubs_keyboard
-        )
-    elif data == "kbk":
-        await edit_media_or_send_new(
-            msg,
-            image_path="img/KBK.jpg",
-            caption_html="<a href='https://t.me/forumcbc'><b>Перейти в Telegram</b></a>\n<a href='https://vk.com/forumcbc'><b>Перейти в VK</b></a>",
-            kb=studclubs_keyboard
-        )
-    elif data == "falcon":
-        await edit_media_or_send_new(
-            msg,
-            image_path="img/Falcon.jpg",
-            caption_html="<a href='https://t.me/falcongsom'><b>Перейти в Telegram</b></a>",
-            kb=studclubs_keyboard
-        )
-    elif data == "MCW":
-        await edit_media_or_send_new(
-            msg,
-            image_path="img/MCW.jpg",
-            caption_html="<a href='https://t.me/mcwgsom'><b>Перейти в Telegram</b></a>",
-            kb=studclubs_keyboard
-        )
+    for key, image, caption in c.clubs:
+        screens.add(key, Screen(caption, c.studclubs_keyboard, image=image))
 
     # ==== контакты ====
-    elif data == "contacts":
-        await edit_text_or_send_new(msg, section("📞 Контакты", ["Выбери категорию ниже 👇"]), contacts_keyboard)
+    screens.add("contacts",         Screen(section("📞 Контакты", ["Выбери категорию ниже 👇"]), contacts_keyboard))
+    screens.add("contact_admin",    Screen(c.admin_contacts_html, contacts_keyboard))
+    screens.add("contact_curators", Screen(section("Кураторы", ["<a href='https://t.me/gsomates'>Кураторский канал</a>"]),
+                                           contacts_keyboard))
+
+    # ==== преподаватели: все страницы заранее ====
+    total_pages = (len(c.teachers) + TEACHERS_PER_PAGE - 1) // TEACHERS_PER_PAGE
+    pages = [Screen(*get_teachers_page(page, c.teachers)) for page in range(1, total_pages + 1)]
+    screens.add_pages("teachers_page", pages)
+    screens.add("contact_teachers", pages[0])
+    return screens
+
+SCREENS = build_screens(CONTENT_VIEW)
+
+async def apply_content(fresh: dict):
+    """Пересобирает изменившиеся разделы вне цикла событий и подменяет всё одним шагом."""
+    global CONTENT_VIEW, SCREENS
+    view = await asyncio.to_thread(compile_sections, fresh, CONTENT_VIEW)
+    screens = await asyncio.to_thread(build_screens, view)
+    if IMG_OPTIMIZE:
+        await IMAGE_VARIANTS.prepare(screens.images())
+    # дальше без await: хендлер видит либо весь старый контент, либо весь новый
+    CONTENT_VIEW, SCREENS = view, screens
+    if "teachers" in fresh:
+        find_teachers_text.cache_clear()
+
+content_watcher = ContentWatcher(CONTENT, apply_content, interval=float(os.getenv("CONTENT_POLL", "2")))
 
-    elif data == "contact_admin":
-        await edit_text_or_send_new(msg, ADMIN_CONTACTS_HTML, contacts_keyboard)
+# ======================= КОЛБЭКИ =======================
+# Нажатие подтверждаем сразу (крутилка в клиенте гаснет до отрисовки). Рисуем по одному на чат:
+# если пока идёт отрисовка пришло несколько нажатий, показываем только последнее
+callbacks = Coalescer()
 
-    elif data == "contact_teachers":
-        # первая страница списка преподавателей
-        text, kb = get_teachers_page(1)
-        await edit_text_or_send_new(msg, text, kb)
+async def ack_callback(cb: types.CallbackQuery):
+    try:
+        await cb.answer("Обновлено", show_alert=False)
+    except TelegramBadRequest:   # «query is too old» — всё равно отрисуем
+        pass
 
-    elif data.startswith("teachers_page:"):
-        # пагинация преподавателей
-        try:
-            page = int(data.split(":")[1])
-        except Exception:
-            page = 1
-        text, kb = get_teachers_page(page)
-        await edit_text_or_send_new(msg, text, kb)
-
-    elif data == "contact_curators":
-        await edit_text_or_send_new(
-            msg,
-            section("Кураторы", ["<a href='https://t.me/gsomates'>Кураторский канал</a>"]),
-            contacts_keyboard
-        )
+@dp.callback_query()
+async def callback_handler(cb: types.CallbackQuery):
+    spawn(ack_callback(cb))   # не ждём: иначе ответ занимает слот чата и нажатия выстраиваются в очередь
+    screen = SCREENS.resolve(cb.data or "")
+    if screen is None or cb.message is None:
+        return
+    label_callback(SCREENS.key_of(cb.data or ""))
+
+    chat_id = cb.message.chat.id
+
+    async def render():
+        # карточку берём на момент отрисовки, а не из нажатия: отложенное нажатие могло прийти
+        # на сообщение, которое предыдущая отрисовка уже заменила (текст -> фото: удалено, отправлено новое)
+        mid = await get_active_msg_id(chat_id)
+        if mid is None or mid == cb.message.message_id:
+            mid, photo = cb.message.message_id, bool(cb.message.photo)
+        else:
+            photo = await registry.is_photo(chat_id, mid)
+        if screen.image:
+            await edit_media_or_send_new(chat_id, mid, photo, screen.image, screen.text, screen.kb, screen.fp)
+        else:
+            await edit_text_or_send_new(chat_id, mid, photo, screen.text, screen.kb, screen.fp)
+    await callbacks.run(chat_id, render)
+
+# ======================= СТАТИСТИКА (админам) =======================
+metrics.gauge("registry_chats", lambda: {(): registry.size()[0]}, "Chats with tracked messages")
+metrics.gauge("registry_messages", lambda: {(): registry.size()[1]}, "Tracked bot messages")
+metrics.gauge("outbound", lambda: {(("stat", k),): v for k, v in outbound.stats().items()},
+              "Outbound scheduler queue depth, waits and counters")
+metrics.gauge("callbacks", lambda: {(("stat", k),): v for k, v in callbacks.stats().items()},
+              "Callback renders in flight / waiting, taps coalesced and dropped as superseded")
+metrics.gauge("broadcast", lambda: {(("stat", k),): v for k, v in broadcasts.stats().items()},
+              "Subscribers and progress of the current broadcast")
+metrics.gauge("deferred_pending", lambda: {(): deferred.pending()}, "Scheduled deletions not yet due")
+metrics.gauge("deferred_postponed", lambda: {(): deferred.postponed}, "Due deletions postponed under load")
+metrics.gauge("updates", lambda: {(("stat", k),): v for k, v in updates.stats().items()},
+              "Updates in handlers / waiting for a slot, max wait, polling pauses")
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} мс"
+
+def stats_text() -> str:
+    chats, entries = registry.size()
+    q = outbound.stats()
+    u = updates.stats()
+    b = broadcasts.stats()
+    lines = [
+        f"Реестр: чатов {chats}, сообщений {entries}",
+        f"Очередь API: {q['queue_interactive']}/{q['queue_normal']}/{q['queue_cleanup']} "
+        f"(карточки/прочее/удаления), ожидание ср. {_ms(q['wait_avg'])}, макс. {_ms(q['wait_max'])}",
+        f"Повторы после 429: {q['retried']}, лишних удалений отброшено: {q['dropped_deletes']}",
+        f"Нажатия: объединено {callbacks.coalesced}, отброшено как устаревшие {callbacks.dropped}",
+        f"Обновления: в работе {u['active']}, ждут {u['queued']}, макс. ожидание {_ms(u['wait_max'])}, "
+        f"пауз приёма {u['intake_paused']}",
+        f"Подписчиков: {b['subscribers']}" + (f"; рассылка #{broadcasts.current.id}: отправлено {b['sent']}, "
+                                              f"ошибок {b['failed']}, выбыло {b['removed']}, {b['rate']:.1f}/с"
+                                              if broadcasts.current else ""),
+        f"Отложенные удаления: в очереди {deferred.pending()}, удалено {deferred.deleted} за {deferred.batches} вызовов, "
+        f"перенесено под нагрузкой {deferred.postponed}",
+    ]
+    fallbacks = ", ".join(f"{dict(k)['path']}/{dict(k)['reason']}={int(v)}"
+                          for k, v in metrics.counters("fallbacks_total").items())
+    skipped = int(sum(metrics.counters("edits_skipped_total").values()))
+    lines.append(f"Фолбэки на новую карточку: {fallbacks or 'нет'}; правок пропущено (без изменений): {skipped}")
+    think = metrics.histograms("think_seconds").get(())
+    if think:
+        lines.append(f"think(): p50 {_ms(think.quantile(.5))}, p95 {_ms(think.quantile(.95))}")
+    lines.append("\n<b>API</b> (вызовов, p50/p95):")
+    for labels, h in sorted(metrics.histograms("api_seconds").items(), key=lambda kv: -kv[1].count):
+        lines.append(f"• {dict(labels)['method']}: {h.count}, {_ms(h.quantile(.5))}/{_ms(h.quantile(.95))}")
+    lines.append("\n<b>Хендлеры</b> (вызовов, p50/p95):")
+    for labels, h in sorted(metrics.histograms("handler_seconds").items(), key=lambda kv: -kv[1].count):
+        d = dict(labels)
+        lines.append(f"• {d['handler']} [{d['status']}]: {h.count}, {_ms(h.quantile(.5))}/{_ms(h.quantile(.95))}")
+    lines.append("\n<b>Кнопки</b> (топ-10, p95):")
+    top = sorted(metrics.histograms("callback_seconds").items(), key=lambda kv: -kv[1].count)[:10]
+    for labels, h in top:
+        lines.append(f"• {html.escape(dict(labels)['key'])}: {h.count}, {_ms(h.quantile(.95))}")
+    return section("📊 Статистика", lines)
+
+@dp.message(Command("stats"))
+async def stats_handler(message: types.Message):
+    schedule_delete(message.chat.id, message.message_id, 0.8)
+    if not message.from_user or message.from_user.id not in ADMIN_IDS:
+        return
+    await show_card_exclusive(message.chat.id, stats_text(), main_keyboard)
+
+BROADCAST_HELP_HTML = section("📣 Рассылка", [
+    "Ответь /broadcast на готовое сообщение (текст или фото с подписью) — оно уйдёт всем подписчикам.",
+    "Или: /broadcast текст объявления; фото с подписью «/broadcast текст».",
+    "/broadcast stop — остановить, /broadcast resume — продолжить прерванную.",
+])
 
-    await cb.answer("Обновлено", show_alert=False)
+@dp.message(Command("broadcast"))
+async def broadcast_handler(message: types.Message):
+    if not message.from_user or message.from_user.id not in ADMIN_IDS:
+        return
+    chat_id = message.chat.id
+    arg = (message.text or message.caption or "").partition(" ")[2].strip()
+    if arg == "stop":
+        await broadcasts.stop()
+        await bot.send_message(chat_id, "⏹ Рассылка остановлена, продолжить: /broadcast resume")
+        return
+    if arg == "resume":
+        try:
+            b = await broadcasts.resume()
+        except BroadcastBusy as e:
+            await bot.send_message(chat_id, f"Уже идёт рассылка #{e.broadcast_id}: /broadcast stop")
+            return
+        await bot.send_message(chat_id, f"▶️ Продолжаю рассылку #{b.id}" if b else "Незавершённых рассылок нет")
+        return
+    src = message.reply_to_message
+    if src is not None:
+        text, photo = src.html_text, (src.photo[-1].file_id if src.photo else None)
+    else:
+        parts = message.html_text.split(maxsplit=1)   # без самой команды, разметка сохраняется
+        text, photo = (parts[1] if len(parts) > 1 else ""), (message.photo[-1].file_id if message.photo else None)
+    if not text and not photo:
+        await bot.send_message(chat_id, BROADCAST_HELP_HTML, parse_mode="HTML")
+        return
+    try:
+        b = await broadcasts.create(text, photo, chat_id)
+    except BroadcastBusy as e:   # её может вести и другой воркер webhook
+        await bot.send_message(chat_id, f"Уже идёт рассылка #{e.broadcast_id}: /broadcast stop")
+        return
+    await bot.send_message(chat_id, f"📣 Рассылка #{b.id} запущена: подписчиков {broadcasts.subscribers()}. "
+                                    f"По окончании пришлю итог.")
+
+@dp.inline_query()
+async def inline_teachers_handler(query: types.InlineQuery):
+    q = query.query.strip()
+    view = CONTENT_VIEW
+    ids = view.teacher_index.lookup(q) if q else range(len(view.inline_results))
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    page = [view.inline_results[i] for i in ids[offset:offset + INLINE_PAGE]]
+    more = offset + INLINE_PAGE < len(ids)
+    await query.answer(page, cache_time=INLINE_CACHE_TIME, is_personal=False,
+                       next_offset=str(offset + INLINE_PAGE) if more else "")
 
 # ======================= ЗАПУСК =======================
-async def main():
+_metrics_runner = None
+
+@dp.startup()
+async def on_startup():
+    global _metrics_runner
+    await registry.start()
+    await deferred.start()
+    if IMG_OPTIMIZE:
+        started = time.monotonic()
+        await IMAGE_VARIANTS.prepare(SCREENS.images())
+        logging.info("card images ready in %.2fs: %d optimised", time.monotonic() - started,
+                     IMAGE_VARIANTS.optimised())
+    content_watcher.start()
+    await broadcasts.start()
+    if METRICS_PORT:
+        try:
+            _metrics_runner = await metrics_mod.start_http(metrics, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logging.warning("metrics endpoint on %s:%s not started: %s", METRICS_HOST, METRICS_PORT, e)
+
+@dp.shutdown()
+async def on_shutdown():
+    await content_watcher.stop()
+    await broadcasts.close()
+    if _background:
+        await asyncio.wait(set(_background), timeout=5)
+    await deferred.stop()
+    await registry.close()
+    if _metrics_runner:
+        await _metrics_runner.cleanup()
+
+async def setup_commands():
     try:
         await bot.set_my_commands([
             types.BotCommand(command="start", description="Запуск / перезапуск"),
             types.BotCommand(command="menu",  description="Открыть меню"),
             types.BotCommand(command="help",  description="Помощь"),
+            types.BotCommand(command="find",  description="Найти преподавателя"),
             types.BotCommand(command="clear", description="Очистить все сообщения бота"),
         ])
     except Exception:
         pass
-    await dp.start_polling(bot)
+
+async def main():
+    await setup_commands()
+    try:
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(), close_bot_session=False)
+    finally:
+        await bot.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if os.getenv("BOT_MODE", "polling") == "webhook":   # BOT_MODE: polling | webhook
+        import webhook
+        webhook.run()
+    else:
+        asyncio.run(main())
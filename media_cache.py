@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+log = logging.getLogger(__name__)
+
+# Фрагменты ответов Bot API, означающие «этот file_id больше не годится»
+_REJECTED_ID_MARKERS = ("file identifier", "file_id", "file reference", "wrong remote file", "wrong file")
+
+
+def _file_sig(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def is_rejected_file_id(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "not modified" not in msg and any(m in msg for m in _REJECTED_ID_MARKERS)
+
+def photo_file_id(msg: Union[types.Message, bool, None]) -> Optional[str]:
+    if isinstance(msg, types.Message) and msg.photo:
+        return msg.photo[-1].file_id   # самый крупный размер
+    return None
+
+
+class MediaCache:
+    """Кэш file_id, которые Telegram вернул после первой загрузки картинки.
+
+    Ключ — путь к файлу; запись валидна, пока совпадают mtime+размер, а при их
+    изменении — sha1 содержимого. Всё хранится в JSON на диске (по боту: file_id
+    привязан к токену).
+    """
+
+    def __init__(self, path: str, namespace: str = "", local_uri: Optional[Callable[[str], str]] = None):
+        self.path = path
+        self.namespace = namespace
+        self.local_uri = local_uri   # локальный Bot API сервер: файл отдаём ссылкой file://, без загрузки
+        self._items: dict[str, dict] = {}
+        self._load()
+
+    # ---------- диск ----------
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("media cache %s unreadable, starting empty: %s", self.path, e)
+            return
+        if raw.get("namespace") == self.namespace:
+            self._items = raw.get("items", {})
+
+    def rebase(self, path: str):
+        """Свой файл для этого процесса (воркер webhook: общий файл писали бы наперегонки).
+        Пока своего файла нет, остаются записи прежнего — загруженное раньше не перезаливается."""
+        self.path = path
+        if os.path.exists(path):
+            self._items = {}
+            self._load()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"namespace": self.namespace, "items": self._items}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    # ---------- API ----------
+    @staticmethod
+    def _key(image_path: str) -> str:
+        return os.path.normpath(image_path)
+
+    def get(self, image_path: str) -> Optional[str]:
+        key = self._key(image_path)
+        item = self._items.get(key)
+        if not item:
+            return None
+        try:
+            mtime, size = _file_sig(image_path)
+        except OSError:
+            return None
+        if (item["mtime"], item["size"]) == (mtime, size):
+            return item["file_id"]
+        # mtime/размер поменялись — сверяем содержимое (например, после git checkout)
+        if _file_sha1(image_path) == item["sha1"]:
+            item["mtime"], item["size"] = mtime, size
+            self._save()
+            return item["file_id"]
+        self.forget(image_path)
+        return None
+
+    def put(self, image_path: str, file_id: str):
+        mtime, size = _file_sig(image_path)
+        self._items[self._key(image_path)] = {
+            "file_id": file_id, "mtime": mtime, "size": size, "sha1": _file_sha1(image_path),
+        }
+        self._save()
+
+    def forget(self, image_path: str):
+        if self._items.pop(self._key(image_path), None) is not None:
+            self._save()
+
+    def _source(self, image_path: str) -> Union[str, FSInputFile]:
+        return self.local_uri(image_path) if self.local_uri else FSInputFile(image_path)
+
+    async def upload(self, image_path: str,
+                     call: Callable[[Union[str, FSInputFile]], Awaitable[Union[types.Message, bool]]]):
+        """Выполняет call(media) с file_id из кэша (или файлом) и запоминает новый file_id.
+        Если Telegram отверг закэшированный id — сбрасываем его и грузим файл заново."""
+        cached = self.get(image_path)
+        try:
+            result = await call(cached or self._source(image_path))
+        except TelegramBadRequest as e:
+            if not cached or not is_rejected_file_id(e):
+                raise
+            log.info("file_id for %s rejected, re-uploading: %s", image_path, e)
+            self.forget(image_path)
+            cached = None
+            result = await call(self._source(image_path))
+        file_id = photo_file_id(result)
+        if file_id and not cached:   # id из кэша сработал — переписывать незачем
+            self.put(image_path, file_id)
+        return result
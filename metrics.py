@@ -0,0 +1,202 @@
+import time
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, TelegramObject
+
+log = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # последний — +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам (линейно внутри корзины), как histogram_quantile."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return BUCKETS[-1]
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Счётчики и гистограммы в памяти процесса + рендер в текстовый формат Prometheus."""
+
+    def __init__(self, prefix: str = "gsom_bot"):
+        self.prefix = prefix
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._hist: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+
+    def _name(self, name: str, kind: str, help_: str) -> str:
+        full = f"{self.prefix}_{name}"
+        self._help.setdefault(full, (kind, help_))
+        return full
+
+    def observe(self, name: str, value: float, help_: str = "", **labels: str):
+        full = self._name(name, "histogram", help_)
+        key = tuple(sorted(labels.items()))
+        series = self._hist.setdefault(full, {})
+        h = series.get(key)
+        if h is None:
+            h = series[key] = Histogram()
+        h.observe(value)
+
+    def inc(self, name: str, value: float = 1, help_: str = "", **labels: str):
+        full = self._name(name, "counter", help_)
+        key = tuple(sorted(labels.items()))
+        series = self._counters.setdefault(full, {})
+        series[key] = series.get(key, 0) + value
+
+    def gauge(self, name: str, fn: Callable[[], Dict[Labels, float]], help_: str = ""):
+        """fn вызывается при каждом сборе метрик и возвращает {labels: value}."""
+        self._gauges[self._name(name, "gauge", help_)] = fn
+
+    # ---------- чтение ----------
+    def histograms(self, name: str) -> Dict[Labels, Histogram]:
+        return self._hist.get(f"{self.prefix}_{name}", {})
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        return self._counters.get(f"{self.prefix}_{name}", {})
+
+    def gauges(self, name: str) -> Dict[Labels, float]:
+        fn = self._gauges.get(f"{self.prefix}_{name}")
+        return fn() if fn else {}
+
+    @staticmethod
+    def _fmt_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        out: List[str] = []
+        for full, (kind, help_) in self._help.items():
+            out.append(f"# HELP {full} {help_ or full}")
+            out.append(f"# TYPE {full} {kind}")
+            if kind == "histogram":
+                for labels, h in self._hist.get(full, {}).items():
+                    acc = 0
+                    for bound, c in zip(list(BUCKETS) + ["+Inf"], h.counts):
+                        acc += c
+                        out.append(f"{full}_bucket{self._fmt_labels(labels, [('le', str(bound))])} {acc}")
+                    out.append(f"{full}_sum{self._fmt_labels(labels)} {h.total}")
+                    out.append(f"{full}_count{self._fmt_labels(labels)} {h.count}")
+            elif kind == "counter":
+                for labels, v in self._counters.get(full, {}).items():
+                    out.append(f"{full}{self._fmt_labels(labels)} {v}")
+            else:
+                try:
+                    values = self._gauges[full]()
+                except Exception:
+                    log.exception("gauge %s failed", full)
+                    continue
+                for labels, v in values.items():
+                    out.append(f"{full}{self._fmt_labels(labels)} {v}")
+        return "\n".join(out) + "\n"
+
+
+# ключ кнопки для callback_seconds: middleware кладёт сюда ячейку, хендлер после resolve записывает ключ.
+# Сырой cb.data в метку не попадает — его присылает клиент, и число рядов было бы неограниченным.
+_callback_key: ContextVar[Optional[List[str]]] = ContextVar("callback_key", default=None)
+
+
+def label_callback(key: str):
+    """Отметить колбэк известным ключом экрана; без вызова колбэк попадёт в key="unknown"."""
+    cell = _callback_key.get()
+    if cell is not None:
+        cell[0] = key
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренняя middleware: время работы хендлера и, для колбэков, время по ключу кнопки."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        obj = data.get("handler")
+        name = getattr(getattr(obj, "callback", None), "__name__", "unknown")
+        cell = ["unknown"]
+        token = _callback_key.set(cell)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _callback_key.reset(token)
+            self.metrics.observe("handler_seconds", elapsed, "Handler latency", handler=name, status=status)
+            if isinstance(event, CallbackQuery):
+                self.metrics.observe("callback_seconds", elapsed, "Callback latency by button key",
+                                     key=cell[0])
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Request-middleware сессии: число и длительность вызовов Bot API по методам."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]):
+        name = method.__api_method__
+        if name == "getUpdates":   # long-poll висит до 30 с — только шум в гистограмме
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            self.metrics.observe("api_seconds", time.perf_counter() - started, "Bot API call latency", method=name)
+            self.metrics.inc("api_calls_total", help_="Bot API calls", method=name, outcome=outcome)
+
+
+async def start_http(metrics: Metrics, host: str, port: int) -> web.AppRunner:
+    async def handle(_: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("metrics on http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,249 @@
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+log = logging.getLogger(__name__)
+
+# Приоритеты: меньше — раньше
+INTERACTIVE, NORMAL, CLEANUP = 0, 1, 2
+
+_PRIORITY = {
+    "answerCallbackQuery": INTERACTIVE, "answerInlineQuery": INTERACTIVE,
+    "editMessageText": INTERACTIVE, "editMessageMedia": INTERACTIVE,
+    "editMessageCaption": INTERACTIVE, "editMessageReplyMarkup": INTERACTIVE,
+    "sendMessage": INTERACTIVE, "sendPhoto": INTERACTIVE,
+    "deleteMessage": CLEANUP, "deleteMessages": CLEANUP,
+}
+_DELETES = {"deleteMessage", "deleteMessages"}
+# ответы на удаление, после которых сообщения точно нет — пометку «удалено» оставляем
+_DELETE_GONE = ("message to delete not found", "message_id_invalid")
+# Приоритет, заданный задаче целиком (рассылка и прочая фоновая работа); удаления остаются CLEANUP
+_task_priority: ContextVar[Optional[int]] = ContextVar("outbound_priority", default=None)
+
+
+def use_priority(prio: int):
+    """Все вызовы API из текущей задачи (и задач, порождённых ею дальше) идут с приоритетом prio."""
+    _task_priority.set(prio)
+
+
+# Служебные вызовы мимо очереди (long-poll getUpdates нельзя задерживать)
+_PASSTHROUGH = {"getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo",
+                "setMyCommands", "close", "logOut"}
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp", "paused_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp, self.paused_until = burst, time.monotonic(), 0.0
+
+    def ready_at(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        at = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(at, self.paused_until)
+
+    def idle(self, now: float) -> bool:
+        return self.ready_at(now) <= now and self.tokens >= self.burst
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Единая очередь исходящих вызовов Bot API.
+
+    Глобальный и початовый token bucket, приоритеты (правки карточек раньше
+    удалений), автоповтор после RetryAfter и отбрасывание удалений, которые уже
+    выполнены или в полёте. Подключается как request-middleware сессии бота.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3, remember_deleted: int = 10_000):
+        self.chat_rate, self.chat_burst = chat_rate, chat_burst
+        self.max_retries = max_retries
+        self._global = _Bucket(global_rate, max(1.0, global_rate))
+        self._chats: Dict[Any, _Bucket] = {}
+        self._waiters: List[list] = []   # [prio, seq, chat_id, future, enqueued_at]
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+        # недавно удалённые (или удаляемые) сообщения — повторные удаления не нужны
+        self._deleted: Dict[Any, set] = {}
+        self._deleted_order: deque = deque()
+        self._remember_deleted = remember_deleted
+        # счётчики для наблюдаемости
+        self.granted = self.retried = self.dropped = 0
+        self.wait_total = self.wait_max = 0.0
+
+    # ---------- middleware ----------
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]):
+        name = method.__api_method__
+        if name in _PASSTHROUGH:
+            return await make_request(bot, method)
+        prio = _PRIORITY.get(name, NORMAL)
+        forced = _task_priority.get()
+        if forced is not None and prio != CLEANUP:
+            prio = forced
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self._acquire(prio, chat_id)
+            if name in _DELETES:
+                method = self._skip_deleted(method, chat_id)
+                if method is None:
+                    self.dropped += 1
+                    return True
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if name in _DELETES:
+                    self._unmark_deleted(method, chat_id)
+                if attempt == self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                log.warning("flood control on %s chat=%s, retry in %ss", name, chat_id, e.retry_after)
+                self._pause(chat_id, e.retry_after)
+            except TelegramBadRequest as e:
+                if name in _DELETES and not any(g in e.message.lower() for g in _DELETE_GONE):
+                    self._unmark_deleted(method, chat_id)
+                raise
+            except BaseException:
+                # сеть, 5xx, отмена: удалилось ли сообщение — неизвестно, следующее удаление не отбрасываем
+                if name in _DELETES:
+                    self._unmark_deleted(method, chat_id)
+                raise
+
+    # ---------- удаления ----------
+    @staticmethod
+    def _delete_ids(method) -> List[int]:
+        ids = getattr(method, "message_ids", None)
+        return list(ids) if ids is not None else [method.message_id]
+
+    def _skip_deleted(self, method, chat_id):
+        done = self._deleted.setdefault(chat_id, set())
+        ids = self._delete_ids(method)
+        left = [mid for mid in ids if mid not in done]
+        if not left:
+            return None
+        for mid in left:
+            done.add(mid)
+            self._deleted_order.append((chat_id, mid))
+        while len(self._deleted_order) > self._remember_deleted:
+            old_chat, old_mid = self._deleted_order.popleft()
+            bucket = self._deleted.get(old_chat)
+            if bucket is not None:
+                bucket.discard(old_mid)
+                if not bucket:
+                    del self._deleted[old_chat]
+        if len(left) != len(ids):
+            method = method.model_copy(update={"message_ids": left})
+        return method
+
+    def _unmark_deleted(self, method, chat_id):
+        done = self._deleted.get(chat_id)
+        if done:
+            done.difference_update(self._delete_ids(method))
+
+    # ---------- очередь ----------
+    def _chat_bucket(self, chat_id) -> Optional[_Bucket]:
+        if chat_id is None:
+            return None
+        b = self._chats.get(chat_id)
+        if b is None:
+            if len(self._chats) > 10_000:   # выкидываем простаивающие бакеты
+                now = time.monotonic()
+                self._chats = {k: v for k, v in self._chats.items() if not v.idle(now)}
+            b = self._chats[chat_id] = _Bucket(self.chat_rate, self.chat_burst)
+        return b
+
+    def _pause(self, chat_id, seconds: float):
+        until = time.monotonic() + seconds
+        b = self._chat_bucket(chat_id) or self._global
+        b.paused_until = max(b.paused_until, until)
+
+    async def _acquire(self, prio: int, chat_id):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        fut = asyncio.get_running_loop().create_future()
+        entry = [prio, next(self._seq), chat_id, fut, time.monotonic()]
+        self._waiters.append(entry)
+        self._wake.set()
+        try:
+            await fut
+        finally:
+            if not fut.done() or fut.cancelled():
+                try:
+                    self._waiters.remove(entry)
+                except ValueError:
+                    pass
+
+    async def _pump(self):
+        while True:
+            if not self._waiters:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            now = time.monotonic()
+            next_at = self._global.ready_at(now)
+            granted = False
+            if next_at <= now:
+                next_at = float("inf")
+                for entry in sorted(self._waiters, key=lambda e: (e[0], e[1])):
+                    fut = entry[3]
+                    if fut.done():
+                        self._waiters.remove(entry)
+                        continue
+                    b = self._chat_bucket(entry[2])
+                    ready = b.ready_at(now) if b else now
+                    if ready > now:
+                        next_at = min(next_at, ready)
+                        continue
+                    self._global.tokens -= 1
+                    if b:
+                        b.tokens -= 1
+                    self._waiters.remove(entry)
+                    wait = now - entry[4]
+                    self.granted += 1
+                    self.wait_total += wait
+                    self.wait_max = max(self.wait_max, wait)
+                    fut.set_result(None)
+                    granted = True
+                    break
+            if granted:
+                continue
+            self._wake.clear()
+            timeout = None if next_at == float("inf") else max(0.0, next_at - now)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- наблюдаемость ----------
+    def stats(self) -> dict:
+        now = time.monotonic()
+        depth = {INTERACTIVE: 0, NORMAL: 0, CLEANUP: 0}
+        oldest = 0.0
+        for prio, _, _, fut, enq in self._waiters:
+            if not fut.done():
+                depth[prio] += 1
+                oldest = max(oldest, now - enq)
+        return {
+            "queue_interactive": depth[INTERACTIVE], "queue_normal": depth[NORMAL],
+            "queue_cleanup": depth[CLEANUP], "queue_oldest_wait": oldest,
+            "granted": self.granted, "retried": self.retried, "dropped_deletes": self.dropped,
+            "wait_avg": self.wait_total / self.granted if self.granted else 0.0,
+            "wait_max": self.wait_max,
+        }
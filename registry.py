@@ -0,0 +1,306 @@
+import os
+import time
+import bisect
+import asyncio
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from bulk_delete import DELETE_WINDOW
+
+log = logging.getLogger(__name__)
+
+
+class _ChatLog:
+    """Сообщения бота в одном чате: два плотных массива (id, время) в порядке отправки."""
+    __slots__ = ("ids", "ts")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.ts = array("l")   # unix-секунды
+
+    def push(self, mid: int, sent_at: int):
+        if not self.ts or sent_at >= self.ts[-1]:
+            self.ids.append(mid)
+            self.ts.append(sent_at)
+        else:   # запись «из прошлого» — держим массив отсортированным по времени
+            i = bisect.bisect_right(self.ts, sent_at)
+            self.ids.insert(i, mid)
+            self.ts.insert(i, sent_at)
+
+    def trim(self, oldest: int, cap: int):
+        k = bisect.bisect_left(self.ts, oldest)
+        k = max(k, len(self.ids) - cap)
+        if k > 0:
+            del self.ids[:k]
+            del self.ts[:k]
+
+    def items(self) -> List[Tuple[int, float]]:
+        return list(dict(zip(self.ids, self.ts)).items())
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class MemoryRegistry:
+    """Активная карточка и журнал сообщений бота по чатам, в памяти процесса.
+
+    Записи старше окна удаления Telegram выбрасываются, на чат хранится не более cap штук."""
+
+    SWEEP_EVERY = 1000   # полный обход чатов раз в столько push'ей
+
+    def __init__(self, cap: int = 500, window: int = DELETE_WINDOW):
+        self.cap, self.window = cap, window
+        self._active: Dict[int, int] = {}
+        self._logs: Dict[int, _ChatLog] = {}
+        self._fp: Dict[int, Tuple[int, str, bool]] = {}   # чат -> (id сообщения, отпечаток показанного, фото ли)
+        self._pushes = 0
+
+    async def start(self): pass
+    async def close(self): pass
+
+    # ---------- активная карточка ----------
+    async def get_active(self, chat_id: int) -> Optional[int]:
+        return self._active.get(chat_id)
+
+    async def set_active(self, chat_id: int, mid: int):
+        self._active[chat_id] = mid
+
+    async def clear_active(self, chat_id: int):
+        self._active.pop(chat_id, None)
+
+    # ---------- что сейчас показано (только в памяти: после рестарта первая правка просто не пропустится) ----------
+    async def get_fingerprint(self, chat_id: int, mid: int) -> Optional[str]:
+        fp = self._fp.get(chat_id)
+        return fp[1] if fp and fp[0] == mid else None
+
+    async def set_fingerprint(self, chat_id: int, mid: int, fingerprint: str, photo: bool = False):
+        self._fp[chat_id] = (mid, fingerprint, photo)
+
+    async def is_photo(self, chat_id: int, mid: int) -> Optional[bool]:
+        """Медиакарточка ли mid; None — неизвестно (не запоминали или запомнили другое сообщение)."""
+        fp = self._fp.get(chat_id)
+        return fp[2] if fp and fp[0] == mid else None
+
+    # ---------- журнал ----------
+    def _log_push(self, chat_id: int, mid: int, sent_at: int):
+        log_ = self._logs.get(chat_id)
+        if log_ is None:
+            log_ = self._logs[chat_id] = _ChatLog()
+        log_.push(mid, sent_at)
+        if len(log_) > self.cap:
+            log_.trim(sent_at - self.window, self.cap)
+        self._pushes += 1
+        if self._pushes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+    async def push(self, chat_id: int, mid: int, sent_at: Optional[float] = None):
+        self._log_push(chat_id, mid, int(time.time() if sent_at is None else sent_at))
+
+    async def get_all(self, chat_id: int) -> List[Tuple[int, float]]:
+        log_ = self._logs.get(chat_id)
+        if log_ is None:
+            return []
+        log_.trim(int(time.time()) - self.window, self.cap)
+        return log_.items()
+
+    async def clear(self, chat_id: int):
+        self._logs.pop(chat_id, None)
+        self._fp.pop(chat_id, None)
+
+    def sweep(self):
+        oldest = int(time.time()) - self.window
+        for chat_id in list(self._logs):
+            log_ = self._logs[chat_id]
+            log_.trim(oldest, self.cap)
+            if not len(log_):
+                del self._logs[chat_id]
+        # активная карточка сама лежит в журнале: пустой журнал — карточка старше окна, чат забываем
+        for chat_id in (self._active.keys() | self._fp.keys()) - self._logs.keys():
+            self._forget_idle(chat_id)
+
+    def _forget_idle(self, chat_id: int):
+        self._active.pop(chat_id, None)
+        self._fp.pop(chat_id, None)
+
+    def size(self) -> Tuple[int, int]:
+        """(чатов с журналом, записей всего)"""
+        return len(self._logs), sum(len(l) for l in self._logs.values())
+
+
+class SQLiteRegistry(MemoryRegistry):
+    """То же, что MemoryRegistry, но с хранением в SQLite.
+
+    Память служит кэшем для прочитанных чатов; изменения копятся и пишутся
+    одной транзакцией раз в flush_interval секунд или по накоплении batch_size."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS active (chat_id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS registry (
+        chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, sent_at INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS registry_sent_at ON registry (sent_at);
+    """
+
+    def __init__(self, path: str, cap: int = 500, window: int = DELETE_WINDOW,
+                 flush_interval: float = 1.0, batch_size: int = 500, cached_chats: int = 50_000):
+        super().__init__(cap=cap, window=window)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.flush_interval, self.batch_size, self.cached_chats = flush_interval, batch_size, cached_chats
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+        self._db_lock = threading.Lock()
+        self._loaded: "OrderedDict[int, None]" = OrderedDict()
+        self._pending: list = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    # ---------- жизненный цикл ----------
+    async def start(self):
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._db.close()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("registry flush failed")
+
+    # ---------- синхронная часть (в потоке) ----------
+    def _read_chat(self, chat_id: int):
+        with self._db_lock:
+            active = self._db.execute("SELECT message_id FROM active WHERE chat_id=?", (chat_id,)).fetchone()
+            rows = self._db.execute(
+                "SELECT message_id, sent_at FROM registry WHERE chat_id=? AND sent_at>=? ORDER BY sent_at, message_id",
+                (chat_id, int(time.time()) - self.window)).fetchall()
+        return active[0] if active else None, rows
+
+    def _write(self, ops: list):
+        touched = set()
+        with self._db_lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN")
+            try:
+                for op, chat_id, *args in ops:
+                    if op == "push":
+                        cur.execute("INSERT OR REPLACE INTO registry VALUES (?,?,?)", (chat_id, *args))
+                        touched.add(chat_id)
+                    elif op == "active":
+                        cur.execute("INSERT OR REPLACE INTO active VALUES (?,?)", (chat_id, *args))
+                    elif op == "clear_active":
+                        cur.execute("DELETE FROM active WHERE chat_id=?", (chat_id,))
+                    elif op == "clear":
+                        cur.execute("DELETE FROM registry WHERE chat_id=?", (chat_id,))
+                cur.execute("DELETE FROM registry WHERE sent_at<?", (int(time.time()) - self.window,))
+                for chat_id in touched:
+                    cur.execute(
+                        "DELETE FROM registry WHERE chat_id=? AND message_id NOT IN "
+                        "(SELECT message_id FROM registry WHERE chat_id=? ORDER BY sent_at DESC, message_id DESC LIMIT ?)",
+                        (chat_id, chat_id, self.cap))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    # ---------- кэш ----------
+    async def _ensure(self, chat_id: int):
+        if chat_id in self._loaded:
+            self._loaded.move_to_end(chat_id)
+            return
+        active, rows = await asyncio.to_thread(self._read_chat, chat_id)
+        if chat_id in self._loaded:   # пока читали, чат подгрузил другой вызов
+            return
+        self._loaded[chat_id] = None
+        if active is not None:
+            self._active.setdefault(chat_id, active)
+        if rows:
+            fresh = self._logs.pop(chat_id, None)
+            for mid, sent_at in rows:
+                self._log_push(chat_id, mid, sent_at)
+            if fresh is not None:   # записи, добавленные до загрузки, идут после
+                for mid, sent_at in zip(fresh.ids, fresh.ts):
+                    self._log_push(chat_id, mid, sent_at)
+
+    def _queue(self, *op):
+        self._pending.append(op)
+        if len(self._pending) >= self.batch_size and self._flush_lock is not None:
+            asyncio.create_task(self.flush())
+
+    async def flush(self):
+        if not self._pending:
+            return
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            ops, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, ops)
+            except Exception:
+                self._pending[:0] = ops   # не теряем — попробуем в следующий раз
+                raise
+            # из кэша выселяем только после записи, иначе повторная загрузка не увидит изменений
+            while len(self._loaded) > self.cached_chats:
+                chat_id, _ = self._loaded.popitem(last=False)
+                self._active.pop(chat_id, None)
+                self._logs.pop(chat_id, None)
+                self._fp.pop(chat_id, None)
+
+    def _forget_idle(self, chat_id: int):
+        # активная карточка здесь — кэш базы, его ограничивает cached_chats; отпечаток есть только в памяти
+        self._fp.pop(chat_id, None)
+
+    # ---------- API ----------
+    async def get_active(self, chat_id: int) -> Optional[int]:
+        await self._ensure(chat_id)
+        return await super().get_active(chat_id)
+
+    async def set_active(self, chat_id: int, mid: int):
+        await self._ensure(chat_id)
+        await super().set_active(chat_id, mid)
+        self._queue("active", chat_id, mid)
+
+    async def clear_active(self, chat_id: int):
+        await self._ensure(chat_id)
+        await super().clear_active(chat_id)
+        self._queue("clear_active", chat_id)
+
+    async def push(self, chat_id: int, mid: int, sent_at: Optional[float] = None):
+        await self._ensure(chat_id)
+        sent_at = int(time.time() if sent_at is None else sent_at)
+        self._log_push(chat_id, mid, sent_at)
+        self._queue("push", chat_id, mid, sent_at)
+
+    async def get_all(self, chat_id: int) -> List[Tuple[int, float]]:
+        await self._ensure(chat_id)
+        return await super().get_all(chat_id)
+
+    async def clear(self, chat_id: int):
+        await self._ensure(chat_id)
+        await super().clear(chat_id)
+        self._queue("clear", chat_id)
+
+
+def make_registry(backend: str, path: str, cap: int) -> MemoryRegistry:
+    if backend == "memory":
+        return MemoryRegistry(cap=cap)
+    if backend == "sqlite":
+        return SQLiteRegistry(path, cap=cap)
+    raise RuntimeError(f"Неизвестный REGISTRY_BACKEND: {backend!r} (memory | sqlite)")
@@ -0,0 +1,81 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Sequence, Set
+
+from aiogram.types import InlineKeyboardMarkup
+
+
+def card_fingerprint(body_html: str, kb: Optional[InlineKeyboardMarkup], image: Optional[str] = None) -> str:
+    """Что показано в карточке: повторную правку тем же содержимым не шлём."""
+    h = hashlib.blake2b(digest_size=12)
+    for part in (image or "", body_html, kb.model_dump_json(exclude_none=True) if kb else ""):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@dataclass(frozen=True)
+class Screen:
+    """Готовая карточка: текст (или подпись к картинке) + клавиатура."""
+    text: str
+    kb: Optional[InlineKeyboardMarkup] = None
+    image: Optional[str] = None   # путь к картинке — медиакарточка
+    fp: str = field(init=False, repr=False, compare=False)   # card_fingerprint — один раз, не на каждое нажатие
+
+    def __post_init__(self):
+        object.__setattr__(self, "fp", card_fingerprint(self.text, self.kb, self.image))
+
+
+class ScreenRegistry:
+    """callback_data -> Screen. Всё рендерится один раз при старте, показ — поиск в словаре.
+
+    Параметризованные ключи вида «prefix:arg» заранее раскладываются по точным ключам
+    (add); для остальных значений аргумента семейство задаёт fallback (add_family)."""
+
+    def __init__(self):
+        self._exact: Dict[str, Screen] = {}
+        self._families: Dict[str, Callable[[str], Optional[Screen]]] = {}
+
+    def add(self, key: str, screen: Screen):
+        self._exact[key] = screen
+
+    def add_family(self, prefix: str, fallback: Callable[[str], Optional[Screen]]):
+        self._families[prefix] = fallback
+
+    def add_pages(self, prefix: str, pages: Sequence[Screen]):
+        """Постраничный раздел: «prefix:1»…«prefix:N»; кривой или вышедший за границы номер — ближайшая страница."""
+        for page, screen in enumerate(pages, start=1):
+            self.add(f"{prefix}:{page}", screen)
+
+        def fallback(arg: str) -> Screen:
+            try:
+                page = int(arg)
+            except ValueError:
+                page = 1
+            return pages[max(1, min(page, len(pages))) - 1]
+        self.add_family(prefix, fallback)
+
+    def resolve(self, data: str) -> Optional[Screen]:
+        screen = self._exact.get(data)
+        if screen is not None:
+            return screen
+        prefix, sep, arg = data.partition(":")
+        fallback = self._families.get(prefix) if sep else None
+        return fallback(arg) if fallback else None
+
+    def key_of(self, data: str) -> str:
+        """Ограниченный ключ для метрик: точный ключ как есть, параметризованный — «prefix:*»."""
+        if data in self._exact:
+            return data
+        prefix, sep, _ = data.partition(":")
+        return f"{prefix}:*" if sep and prefix in self._families else "unknown"
+
+    def images(self) -> Set[str]:
+        """Все картинки заранее собранных медиакарточек."""
+        return {s.image for s in self._exact.values() if s.image}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._exact
+
+    def __len__(self) -> int:
+        return len(self._exact)
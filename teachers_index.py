@@ -0,0 +1,132 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+_DEPT_RE = re.compile(r"кафедр[аы]\s+([^,]+)")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w.-]+")
+_WORD_RE = re.compile(r"[\w@.+-]+")
+# слова запроса, которые ничего не сужают: «кафедра маркетинга», «финансы и учёт»
+_STOP_WORDS = {"кафедра", "кафедры", "кафедре", "кафедру", "кафедрой", "и", "в", "во", "на", "по"}
+# окончания прилагательных и существительных: кафедры в строках стоят в родительном падеже,
+# а ищут их как придётся — «финансы», «операционный менеджмент»; длинные раньше коротких
+_ENDINGS = sorted("""ого его ому ему ыми ими ами ями иями иях ией ых их ый ий ой ая яя ое ее ые ие ую юю
+                     ов ев ей ам ям ах ях ом ем ия ию ии ья ье ы и а я о е у ю ь""".split(), key=len, reverse=True)
+_MIN_STEM = 3
+
+
+def norm(s: str) -> str:
+    """Регистр и ё/е не различаем."""
+    return s.lower().replace("ё", "е")
+
+
+def stem(word: str) -> str:
+    """Слово без падежного окончания: «маркетинга» и «маркетинг» -> «маркетинг»."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+@dataclass(frozen=True)
+class Teacher:
+    line: str                  # исходная строка из TEACHERS
+    name: str
+    position: str
+    department: Optional[str]
+    email: Optional[str]
+
+    @classmethod
+    def parse(cls, line: str) -> "Teacher":
+        name, _, rest = line.partition(" — ")
+        email = _EMAIL_RE.search(rest)
+        dept = _DEPT_RE.search(rest)
+        position = rest[:email.start()].rstrip(", ") if email else rest.rsplit(",", 1)[0]
+        return cls(line=line, name=name.strip(), position=position.strip(),
+                   department=dept.group(1).strip() if dept else None,
+                   email=email.group(0) if email else None)
+
+
+class _Trie:
+    """Префиксное дерево: в каждом узле — id всех записей поддерева (поиск за O(len(prefix)))."""
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_Trie"] = {}
+        self.ids: Set[int] = set()
+
+    def insert(self, word: str, idx: int):
+        node = self
+        for ch in word:
+            node = node.children.setdefault(ch, _Trie())
+            node.ids.add(idx)
+
+    def find(self, prefix: str) -> Set[int]:
+        node = self
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+
+class TeacherIndex:
+    """Поиск по фамилии (префикс), кафедре и фрагменту почты.
+
+    Каждое слово запроса ищется по всем трём индексам, результаты слов пересекаются:
+    «смир маркетинг» — Смирнова с кафедры маркетинга. Слова кафедры сравниваются по основе
+    (без окончания), служебные слова запроса («кафедра», «и») отбрасываются."""
+
+    def __init__(self, lines: Iterable[str]):
+        self.teachers: List[Teacher] = [Teacher.parse(l) for l in lines]
+        self._surnames = _Trie()
+        self._names = _Trie()              # имя и отчество — если фамилии не нашлось
+        self._dept_words = _Trie()         # инвертированный индекс по основам слов кафедры
+        self._emails = _Trie()             # все суффиксы почты: подстрока = префикс суффикса
+        # кэш на экземпляр: кэш на методе класса держал бы старые индексы после перезагрузки списка
+        self._lookup = lru_cache(maxsize=1024)(self._find)
+        for idx, t in enumerate(self.teachers):
+            words = norm(t.name).split()
+            if words:
+                self._surnames.insert(words[0], idx)
+            for w in words[1:]:
+                self._names.insert(w, idx)
+            if t.department:
+                for w in _WORD_RE.findall(norm(t.department)):
+                    self._dept_words.insert(stem(w), idx)
+            if t.email:
+                e = norm(t.email)
+                for i in range(len(e)):
+                    self._emails.insert(e[i:], idx)
+
+    def _match_word(self, word: str) -> Tuple[Set[int], Set[int]]:
+        """(совпадения по фамилии, прочие совпадения)"""
+        surname = self._surnames.find(word)
+        other = self._names.find(word) | self._dept_words.find(stem(word))
+        if len(word) >= 2 or "@" in word:
+            other = other | self._emails.find(word)
+        return surname, other - surname
+
+    def lookup(self, query: str) -> Tuple[int, ...]:
+        """Номера найденных записей в self.teachers."""
+        return self._lookup(norm(query).strip())
+
+    def _find(self, query: str) -> Tuple[int, ...]:
+        words = _WORD_RE.findall(query)
+        words = [w for w in words if w not in _STOP_WORDS] or words
+        if not words:
+            return ()
+        hits: Optional[Set[int]] = None
+        by_surname: Set[int] = set()
+        for w in words:
+            surname, other = self._match_word(w)
+            by_surname |= surname
+            found = surname | other
+            hits = found if hits is None else hits & found
+            if not hits:
+                return ()
+        # сначала совпавшие по фамилии, внутри — в алфавитном порядке исходного списка
+        return tuple(sorted(hits, key=lambda i: (i not in by_surname, i)))
+
+    def search(self, query: str) -> Sequence[Teacher]:
+        return [self.teachers[i] for i in self.lookup(query)]
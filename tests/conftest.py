@@ -0,0 +1,29 @@
+import os
+import sys
+import contextlib
+
+import pytest
+
+# модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+@pytest.fixture
+def fake_bot():
+    """Фабрика: async with fake_bot(api) as bot — бот, который ходит в заглушку Bot API
+    в текущем цикле событий (тесты запускают корутины через asyncio.run)."""
+    @contextlib.asynccontextmanager
+    async def start(api: FakeBotAPI):
+        async with api.serve() as base:
+            bot = Bot("42:test", session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+            try:
+                yield bot
+            finally:
+                await bot.session.close()
+    return start
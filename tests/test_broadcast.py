@@ -0,0 +1,142 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from broadcast import _MIN_CHAT_ID, BroadcastBusy, Broadcaster
+from fake_bot_api import FakeBotAPI
+
+
+async def subscribe(b: Broadcaster, chats):
+    for chat_id in chats:
+        await b.subscribe(chat_id)
+
+
+def sent_to(api: FakeBotAPI):
+    return [chat_id for method, chat_id in api.sent]
+
+
+def statuses(b: Broadcaster, broadcast_id: int) -> dict:
+    return dict(b._query("SELECT status, COUNT(*) FROM deliveries WHERE broadcast_id=? GROUP BY status",
+                         (broadcast_id,)))
+
+
+def test_every_subscriber_once_blocked_removed(tmp_path, fake_bot):
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            b = Broadcaster(bot, str(tmp_path / "b.sqlite3"), rate=10_000, page_size=50)
+            await b.start()
+            await subscribe(b, range(1, 501))
+            created = await b.create("<b>hi</b>", None, None)
+            await b._task
+            result = statuses(b, created.id), b.subscribers(), b._query("SELECT COUNT(*) FROM subscribers")[0][0]
+            await b.close()
+        return api, result
+
+    api, (total, known, stored) = asyncio.run(go())
+    sent = sent_to(api)
+    assert len(sent) == len(set(sent)) == 499 and 403 not in sent
+    assert total == {"sent": 499, "removed": 1}
+    assert known == stored == 499
+
+
+def test_stop_then_resume_does_not_resend(tmp_path, fake_bot):
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            b = Broadcaster(bot, str(tmp_path / "b.sqlite3"), rate=400, concurrency=5, page_size=10)
+            await b.start()
+            await subscribe(b, range(1, 201))
+            await b.create("hi", None, None)
+            await asyncio.sleep(0.1)
+            await b.stop()
+            before = len(api.sent)
+            resumed = await b.resume()
+            await b._task
+            result = before, statuses(b, resumed.id), b._query("SELECT state FROM broadcasts")
+            await b.close()
+        return api, result
+
+    api, (before, total, states) = asyncio.run(go())
+    sent = sent_to(api)
+    assert 0 < before < 200
+    assert sorted(sent) == list(range(1, 201))
+    assert total == {"sent": 200} and states == [("done",)]
+
+
+def test_pending_after_crash_are_skipped(tmp_path, fake_bot):
+    path = str(tmp_path / "b.sqlite3")
+
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            crashed = Broadcaster(bot, path, page_size=10)
+            await subscribe(crashed, range(1, 31))
+            b = crashed._take((None, "hi", None))
+            crashed._claim_page(b.id, _MIN_CHAT_ID)   # страница взята, процесс «убит» до отправки
+            crashed._query("UPDATE broadcasts SET lease_until=0")
+            crashed._db.close()
+
+            heir = Broadcaster(bot, path, rate=10_000, page_size=10)
+            await heir.start()   # осиротевшую рассылку подхватывает сразу
+            while not heir.running():
+                await asyncio.sleep(0.01)
+            await heir._task
+            result = statuses(heir, b.id)
+            await heir.close()
+        return api, result
+
+    api, total = asyncio.run(go())
+    assert sorted(sent_to(api)) == list(range(11, 31))
+    assert total == {"sent": 20, "pending": 10}
+
+
+def test_migrated_group_is_adopted(tmp_path, fake_bot):
+    async def go():
+        api = FakeBotAPI()
+        api.migrated[-5] = -1005
+        async with fake_bot(api) as bot:
+            b = Broadcaster(bot, str(tmp_path / "b.sqlite3"), rate=10_000)
+            await b.start()
+            await subscribe(b, [-5, 1, 2])
+            created = await b.create("hi", None, None)
+            await b._task
+            result = statuses(b, created.id), sorted(r[0] for r in b._query("SELECT chat_id FROM subscribers"))
+            await b.close()
+        return api, result
+
+    api, (total, subscribers) = asyncio.run(go())
+    assert sorted(sent_to(api)) == [-1005, 1, 2]
+    assert total == {"sent": 3, "removed": 1}
+    assert subscribers == [-1005, 1, 2]
+
+
+def test_second_process_gets_busy_while_lease_is_held(tmp_path, fake_bot):
+    path = str(tmp_path / "b.sqlite3")
+
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            owner = Broadcaster(bot, path, rate=100, page_size=10)
+            other = Broadcaster(bot, path, rate=100, page_size=10)
+            await owner.start()
+            await other.start()
+            await subscribe(owner, range(1, 51))
+            first = await owner.create("hi", None, None)
+            with pytest.raises(BroadcastBusy) as busy:
+                await other.create("again", None, None)
+            with pytest.raises(BroadcastBusy):
+                await other.resume()
+            await other.stop()   # остановка из другого процесса — через базу, владелец замечает её на странице
+            await owner._task
+            states = owner._query("SELECT state FROM broadcasts")
+            await other.close()
+            await owner.close()
+        return api, first, busy.value, states
+
+    api, first, busy, states = asyncio.run(go())
+    assert busy.broadcast_id == first.id
+    assert states == [("cancelled",)]
+    sent = sent_to(api)
+    assert len(sent) < 50 and max(Counter(sent).values()) == 1
@@ -0,0 +1,35 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import DeleteMessages
+
+from bulk_delete import BATCH_SIZE, DELETE_WINDOW, bulk_delete, split_fresh
+
+
+def test_split_fresh():
+    now = 1_000_000.0
+    items = [(5, now), (3, now - DELETE_WINDOW + 1), (9, now - DELETE_WINDOW), (4, None), (5, now)]
+    fresh, old = split_fresh(items, now=now)
+    assert fresh == [3, 4, 5]   # без даты — пробуем; повторы схлопываются; по возрастанию
+    assert old == 1
+
+
+class StubBot:
+    def __init__(self, reject=()):
+        self.batches = []
+        self.reject = set(reject)
+
+    async def delete_messages(self, chat_id, ids):
+        self.batches.append(list(ids))
+        if self.reject & set(ids):
+            raise TelegramBadRequest(DeleteMessages(chat_id=chat_id, message_ids=ids), "message to delete not found")
+        return True
+
+
+def test_bulk_delete_batches_and_reports():
+    bot = StubBot(reject={150})
+    items = [(mid, None) for mid in range(1, 2 * BATCH_SIZE + 11)] + [(999, 0.0)]
+    report = asyncio.run(bulk_delete(bot, 1, items))
+    assert sorted(len(b) for b in bot.batches) == [10, BATCH_SIZE, BATCH_SIZE]
+    assert (report.requested, report.skipped_old, report.api_calls) == (2 * BATCH_SIZE + 11, 1, 3)
+    assert (report.deleted, report.failed) == (BATCH_SIZE + 10, BATCH_SIZE)
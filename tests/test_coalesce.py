@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from coalesce import Coalescer
+
+
+def job(log, name, gate=None, fail=False):
+    async def run():
+        if gate is not None:
+            await gate.wait()
+        log.append(name)
+        if fail:
+            raise RuntimeError(name)
+    return run
+
+
+def test_taps_during_a_render_collapse_to_the_latest():
+    async def go():
+        c, log, gate = Coalescer(), [], asyncio.Event()
+        first = asyncio.create_task(c.run(1, job(log, "a", gate)))
+        await asyncio.sleep(0)
+        queued = [await c.run(1, job(log, name)) for name in ("b", "c", "d")]
+        other = await c.run(2, job(log, "x"))   # другой чат не ждёт
+        gate.set()
+        return await first, queued, other, log, c.stats()
+
+    first, queued, other, log, stats = asyncio.run(go())
+    assert (first, queued, other) == (True, [False, False, False], True)
+    assert log == ["x", "a", "d"]
+    assert stats == {"in_flight": 0, "pending": 0, "coalesced": 3, "dropped": 2}
+
+
+def test_failed_render_does_not_lose_the_latest_tap():
+    async def go():
+        c, log, gate = Coalescer(), [], asyncio.Event()
+        first = asyncio.create_task(c.run(1, job(log, "a", gate, fail=True)))
+        await asyncio.sleep(0)
+        await c.run(1, job(log, "b"))
+        gate.set()
+        await first
+        return log
+
+    assert asyncio.run(go()) == ["a", "b"]
+
+
+def test_failure_of_the_last_render_propagates():
+    async def go():
+        c = Coalescer()
+        with pytest.raises(RuntimeError):
+            await c.run(1, job([], "a", fail=True))
+        return c.stats()
+
+    assert asyncio.run(go())["in_flight"] == 0
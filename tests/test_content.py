@@ -0,0 +1,112 @@
+import os
+import json
+import shutil
+import asyncio
+
+import pytest
+
+from content import SECTIONS, ContentError, ContentStore, ContentWatcher, _check_card, _check_clubs, _check_markup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("text", [
+    "<b>Жирный</b> и <i>курсив</i>, <a href='https://t.me/x'><b>ссылка</b></a>",
+    '<span class="tg-spoiler">спойлер</span> <tg-spoiler>ещё</tg-spoiler>',
+    '<pre><code class="language-python">x &lt; 1 &amp;&amp; y &gt; 2</code></pre>',
+    "<blockquote expandable>цитата</blockquote> &#128512; &quot;",
+    "просто текст",
+])
+def test_telegram_markup_is_accepted(text):
+    _check_markup(text, "t")
+
+
+@pytest.mark.parametrize("text", [
+    "<b>не закрыт",
+    "<b><i>крест</b></i>",
+    "лишний</b>",
+    "<br>перенос",
+    "<p>абзац</p>",
+    "<span>без класса</span>",
+    "<a>без href</a>",
+    '<b class="x">атрибут</b>',
+    "&nbsp;",
+    "<!-- комментарий -->",
+])
+def test_bad_markup_is_rejected(text):
+    with pytest.raises(ContentError):
+        _check_markup(text, "t")
+
+
+def test_card_markup_is_checked():
+    with pytest.raises(ContentError, match="texts.lost"):
+        _check_card({"html": "<b>Потеряшки"}, "texts.lost")
+    with pytest.raises(ContentError):
+        _check_card({"title": "Заголовок", "lines": ["<i>строка"], "footer": ""}, "card")
+    # тег может охватывать несколько строк
+    _check_card({"title": "Заголовок", "lines": ["<i>раз", "два</i>"]}, "card")
+
+
+def test_club_caption_markup_is_checked(tmp_path):
+    image = tmp_path / "club.jpg"
+    image.write_bytes(b"jpg")
+    club = {"key": "club", "title": "Клуб", "image": str(image), "caption": "<a href='https://t.me/x'>TG"}
+    with pytest.raises(ContentError, match=r"clubs\[0\]"):
+        _check_clubs([club])
+
+
+def make_store(tmp_path) -> ContentStore:
+    """Копия content/ во временном каталоге; пути картинок клубов — абсолютные."""
+    for section in SECTIONS:
+        shutil.copy(os.path.join(ROOT, "content", f"{section}.json"), tmp_path)
+    clubs = json.loads((tmp_path / "clubs.json").read_text(encoding="utf-8"))
+    for club in clubs:
+        club["image"] = os.path.join(ROOT, club["image"])
+    (tmp_path / "clubs.json").write_text(json.dumps(clubs, ensure_ascii=False), encoding="utf-8")
+    store = ContentStore(str(tmp_path))
+    store.load_all()
+    return store
+
+
+def edit(store: ContentStore, section: str, change):
+    path = store.path(section)
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    change(raw)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(raw, f, ensure_ascii=False)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))   # mtime мог не сдвинуться
+
+
+def watch(store: ContentStore):
+    applied = []
+
+    async def on_change(fresh):
+        applied.append(sorted(fresh))
+    return ContentWatcher(store, on_change, interval=0), applied
+
+
+def test_only_changed_sections_are_reloaded(tmp_path):
+    store = make_store(tmp_path)
+    watcher, applied = watch(store)
+    edit(store, "teachers", lambda raw: raw.append("Иванов Иван Иванович — доцент, i.ivanov@spbu.ru"))
+
+    assert asyncio.run(watcher.check()) == ["teachers"]
+    assert applied == [["teachers"]]
+    assert store.data["teachers"][-1].startswith("Иванов")
+    assert asyncio.run(watcher.check()) == []   # без новых правок перечитывать нечего
+
+
+def test_bad_section_is_rejected_and_previous_kept(tmp_path):
+    store = make_store(tmp_path)
+    watcher, applied = watch(store)
+    welcome = store.data["texts"]["welcome"]
+    edit(store, "texts", lambda raw: raw["welcome"].update(html="<b>Привет"))
+
+    assert asyncio.run(watcher.check()) == []
+    assert applied == [] and store.data["texts"]["welcome"] == welcome
+
+    edit(store, "texts", lambda raw: raw["welcome"].update(html="<b>Привет</b>"))
+    assert asyncio.run(watcher.check()) == ["texts"]
+    assert store.data["texts"]["welcome"] == {"html": "<b>Привет</b>"}
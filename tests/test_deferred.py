@@ -0,0 +1,79 @@
+import json
+import asyncio
+import contextlib
+
+from deferred import DeferredDeleter
+from fake_bot_api import FakeBotAPI
+
+
+def deleted(api: FakeBotAPI):
+    return sorted((chat_id, mid) for chat_id, ids in api.deletes for mid in ids)
+
+
+def test_due_deletions_are_batched_per_chat(tmp_path, fake_bot):
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            d = DeferredDeleter(bot, str(tmp_path / "deferred.json"))
+            await d.start()
+            for mid in range(10, 15):
+                d.schedule(1, mid, 0.05)
+            for mid in range(20, 23):
+                d.schedule(2, mid, 0.1)   # в пределах slack — та же пачка
+            while d.pending() or d.deleted < 8:
+                await asyncio.sleep(0.02)
+            await d.stop()
+        return api, d
+
+    api, d = asyncio.run(go())
+    assert sorted(api.deletes) == [(1, [10, 11, 12, 13, 14]), (2, [20, 21, 22])]
+    assert d.deleted == 8 and d.batches == 2
+
+
+def test_queue_survives_restart(tmp_path, fake_bot):
+    path = str(tmp_path / "deferred.json")
+
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            crashed = DeferredDeleter(bot, path, save_interval=0.05)
+            await crashed.start()
+            crashed.schedule(1, 10, 0.5)
+            crashed.schedule(2, 20, 0.5)
+            await asyncio.sleep(0.2)   # очередь успела сохраниться
+            crashed._task.cancel()     # процесс «убит»: stop() не вызван
+            with contextlib.suppress(asyncio.CancelledError):
+                await crashed._task
+            saved = json.loads(open(path, encoding="utf-8").read())
+
+            d = DeferredDeleter(bot, path)
+            await d.start()
+            restored = d.pending()
+            while d.pending():
+                await asyncio.sleep(0.05)
+            await d.stop()
+        return api, saved, restored
+
+    api, saved, restored = asyncio.run(go())
+    assert sorted((chat, mid) for _, chat, mid in saved) == [(1, 10), (2, 20)]
+    assert restored == 2
+    assert deleted(api) == [(1, 10), (2, 20)]
+
+
+def test_stop_drains_everything_left(tmp_path, fake_bot):
+    path = tmp_path / "deferred.json"
+
+    async def go():
+        api = FakeBotAPI()
+        async with fake_bot(api) as bot:
+            d = DeferredDeleter(bot, str(path))
+            await d.start()
+            d.schedule(1, 10, 3600)
+            d.schedule(1, 11, 3600)
+            d.schedule(2, 20, 3600)
+            await d.stop()
+        return api, d
+
+    api, d = asyncio.run(go())
+    assert deleted(api) == [(1, 10), (1, 11), (2, 20)]
+    assert d.pending() == 0 and json.loads(path.read_text(encoding="utf-8")) == []
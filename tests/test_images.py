@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+import images
+
+pytestmark = pytest.mark.skipif(not images.available(), reason="Pillow not installed")
+
+
+def make_jpeg(path, size, quality):
+    from PIL import Image
+    noise = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))   # шум плохо сжимается
+    noise.save(path, "JPEG", quality=quality)
+    return str(path)
+
+
+def test_large_image_is_shrunk_and_cached(tmp_path):
+    src = make_jpeg(tmp_path / "big.jpg", (2560, 1440), 100)
+    out = images.optimise(src, str(tmp_path / "cache"))
+    assert out != src and os.path.getsize(out) < os.path.getsize(src)
+    assert images.optimise(src, str(tmp_path / "cache")) == out
+
+
+def test_not_smaller_result_is_cached_too(tmp_path, monkeypatch):
+    src = make_jpeg(tmp_path / "small.jpg", (64, 64), 10)   # пережатие с quality 85 только раздует
+    cache = str(tmp_path / "cache")
+    assert images.optimise(src, cache) == src
+    assert [name.endswith(".keep") for name in os.listdir(cache)] == [True]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("image recompressed again")
+    monkeypatch.setattr(images.Image, "open", fail)
+    assert images.optimise(src, cache) == src
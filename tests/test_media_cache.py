@@ -0,0 +1,58 @@
+import os
+import asyncio
+
+from fake_bot_api import FakeBotAPI
+from media_cache import MediaCache
+
+
+def make_image(tmp_path, data: bytes = b"jpeg bytes"):
+    image = tmp_path / "card.jpg"
+    image.write_bytes(data)
+    return str(image)
+
+
+def touch(path: str):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_entry_survives_touch_but_not_new_content(tmp_path):
+    image = make_image(tmp_path)
+    cache = MediaCache(str(tmp_path / "media.json"))
+    cache.put(image, "id-1")
+
+    touch(image)   # mtime другой, содержимое то же (git checkout) — id годен
+    assert cache.get(image) == "id-1"
+    assert MediaCache(cache.path).get(image) == "id-1"   # и сверка по sha1 записана на диск
+
+    with open(image, "wb") as f:   # тот же размер, другое содержимое
+        f.write(b"JPEG BYTES")
+    touch(image)
+    assert cache.get(image) is None
+    assert MediaCache(cache.path).get(image) is None
+
+
+def test_other_bot_does_not_reuse_file_ids(tmp_path):
+    image = make_image(tmp_path)
+    MediaCache(str(tmp_path / "media.json"), namespace="1").put(image, "id-1")
+    assert MediaCache(str(tmp_path / "media.json"), namespace="2").get(image) is None
+
+
+def test_rejected_file_id_is_reuploaded(tmp_path, fake_bot):
+    image = make_image(tmp_path)
+    cache = MediaCache(str(tmp_path / "media.json"))
+    cache.put(image, "stale-id")
+
+    async def go():
+        api = FakeBotAPI()
+        api.rejected_file_ids.add("stale-id")
+        async with fake_bot(api) as bot:
+            msg = await cache.upload(image, lambda media: bot.send_photo(1, media))
+            again = await cache.upload(image, lambda media: bot.send_photo(1, media))
+        return api, msg, again
+
+    api, msg, again = asyncio.run(go())
+    assert msg.photo and again.photo
+    assert api.calls["sendPhoto"] == 3 and api.errors["400"] == 1   # отказ, перезаливка, повтор по новому id
+    assert cache.get(image) == "fake-photo"
+    assert MediaCache(cache.path).get(image) == "fake-photo"
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import DeleteMessage, DeleteMessages, SendMessage
+
+from outbound import NORMAL, OutboundScheduler, _Bucket, use_priority
+
+
+class Recorder:
+    """make_request для middleware: запоминает порядок вызовов, может ответить 429."""
+
+    def __init__(self, flood: int = 0):
+        self.calls = []
+        self.flood = flood
+
+    async def __call__(self, bot, method):
+        if self.flood:
+            self.flood -= 1
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=0)
+        self.calls.append((method.__api_method__, getattr(method, "message_ids", None)
+                           or getattr(method, "message_id", None) or getattr(method, "text", None)))
+        return True
+
+
+def test_interactive_calls_overtake_queued_cleanup():
+    async def go():
+        sched, rec = OutboundScheduler(global_rate=20), Recorder()
+        sched._global.tokens = 0   # очередь уже упёрлась в глобальный лимит
+        deletes = [asyncio.create_task(sched(rec, None, DeleteMessage(chat_id=i, message_id=i))) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        send = asyncio.create_task(sched(rec, None, SendMessage(chat_id=9, text="card")))
+        await asyncio.gather(send, *deletes)
+        return rec.calls
+
+    calls = asyncio.run(go())
+    assert calls[0] == ("sendMessage", "card")
+    assert [c[0] for c in calls[1:]] == ["deleteMessage"] * 3
+
+
+def test_task_priority_applies_to_sends_but_not_deletes():
+    async def go():
+        sched, rec = OutboundScheduler(global_rate=20), Recorder()
+        sched._global.tokens = 0
+
+        async def background():   # как рассылка: всё, кроме удалений, — NORMAL
+            use_priority(NORMAL)
+            await asyncio.gather(sched(rec, None, DeleteMessage(chat_id=1, message_id=5)),
+                                 sched(rec, None, SendMessage(chat_id=1, text="broadcast")))
+        first = asyncio.create_task(background())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(sched(rec, None, SendMessage(chat_id=2, text="reply")))
+        await asyncio.gather(first, second)
+        return rec.calls
+
+    assert [c[1] for c in asyncio.run(go())] == ["reply", "broadcast", 5]
+
+
+def test_per_chat_rate_limits_one_chat_only():
+    async def go():
+        sched, rec = OutboundScheduler(global_rate=1000, chat_rate=10, chat_burst=1), Recorder()
+        sends = [SendMessage(chat_id=chat_id, text=f"{chat_id}/{i}") for i in range(3) for chat_id in (1, 100 + i)]
+        await asyncio.gather(*(sched(rec, None, m) for m in sends))
+        return [text for _, text in rec.calls]
+
+    # чат 1 ждёт своего токена, остальные чаты его не ждут
+    assert asyncio.run(go()) == ["1/0", "100/0", "101/1", "102/2", "1/1", "1/2"]
+
+
+def test_chat_bucket_refills_at_rate():
+    b = _Bucket(rate=10, burst=2)
+    b.stamp = 0.0
+    assert b.ready_at(0.0) == 0.0
+    b.tokens -= 2
+    assert b.ready_at(0.0) == pytest.approx(0.1)
+    assert b.ready_at(0.05) == pytest.approx(0.1)
+    assert b.ready_at(0.1) == pytest.approx(0.1)
+    b.paused_until = 5.0   # RetryAfter
+    assert b.ready_at(1.0) == 5.0
+
+
+def test_retry_after_is_retried_then_raised():
+    async def go():
+        sched = OutboundScheduler(max_retries=2, chat_rate=1000, chat_burst=1000)
+        ok = Recorder(flood=2)
+        assert await sched(ok, None, SendMessage(chat_id=1, text="x")) is True
+        with pytest.raises(TelegramRetryAfter):
+            await sched(Recorder(flood=10), None, SendMessage(chat_id=1, text="y"))
+        return sched.retried, ok.calls
+
+    retried, calls = asyncio.run(go())
+    assert retried == 4
+    assert calls == [("sendMessage", "x")]
+
+
+def test_repeated_deletes_are_dropped():
+    async def go():
+        sched, rec = OutboundScheduler(), Recorder()
+        await sched(rec, None, DeleteMessages(chat_id=1, message_ids=[1, 2, 3]))
+        await sched(rec, None, DeleteMessage(chat_id=1, message_id=2))        # уже удалено
+        await sched(rec, None, DeleteMessages(chat_id=1, message_ids=[3, 4]))  # остаётся только 4
+        await sched(rec, None, DeleteMessage(chat_id=2, message_id=2))        # другой чат
+        return sched, rec.calls
+
+    sched, calls = asyncio.run(go())
+    assert calls == [("deleteMessages", [1, 2, 3]), ("deleteMessages", [4]), ("deleteMessage", 2)]
+    assert sched.dropped == 1
+
+
+@pytest.mark.parametrize("error, dropped", [
+    (TelegramNetworkError, False),
+    (lambda method, message: TelegramBadRequest(method, "Bad Request: message can't be deleted"), False),
+    (lambda method, message: TelegramBadRequest(method, "Bad Request: message to delete not found"), True),
+])
+def test_failed_delete_is_unmarked_unless_message_is_gone(error, dropped):
+    async def fail(bot, method):
+        raise error(method, "boom")
+
+    async def go():
+        sched, rec = OutboundScheduler(), Recorder()
+        with pytest.raises(Exception):
+            await sched(fail, None, DeleteMessage(chat_id=1, message_id=7))
+        await sched(rec, None, DeleteMessage(chat_id=1, message_id=7))
+        return rec.calls
+
+    assert asyncio.run(go()) == ([] if dropped else [("deleteMessage", 7)])
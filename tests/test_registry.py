@@ -0,0 +1,130 @@
+import time
+import asyncio
+
+import pytest
+
+from registry import MemoryRegistry, SQLiteRegistry, _ChatLog, make_registry
+
+WINDOW = 3600
+
+
+def test_chat_log_keeps_order_and_trims():
+    log_ = _ChatLog()
+    for mid, ts in [(1, 100), (3, 300), (2, 200), (4, 400)]:
+        log_.push(mid, ts)
+    assert [mid for mid, _ in log_.items()] == [1, 2, 3, 4]
+    log_.trim(oldest=200, cap=10)
+    assert [mid for mid, _ in log_.items()] == [2, 3, 4]
+    log_.trim(oldest=0, cap=1)
+    assert log_.items() == [(4, 400)]
+
+
+def test_memory_window_and_cap():
+    async def go():
+        reg = MemoryRegistry(cap=3, window=WINDOW)
+        now = time.time()
+        await reg.push(1, 10, sent_at=now - WINDOW - 5)   # уже не удалить
+        for mid in range(11, 16):
+            await reg.push(1, mid, sent_at=now)
+        await reg.push(2, 20)
+        return await reg.get_all(1), await reg.get_all(2), reg.size()
+
+    chat1, chat2, size = asyncio.run(go())
+    assert [mid for mid, _ in chat1] == [13, 14, 15]
+    assert [mid for mid, _ in chat2] == [20]
+    assert size == (2, 4)
+
+
+def test_memory_active_fingerprint_and_clear():
+    async def go():
+        reg = MemoryRegistry()
+        await reg.set_active(1, 7)
+        await reg.set_fingerprint(1, 7, "fp", photo=True)
+        seen = (await reg.get_active(1), await reg.get_fingerprint(1, 7), await reg.is_photo(1, 7),
+                await reg.get_fingerprint(1, 8), await reg.is_photo(1, 8))
+        await reg.push(1, 7)
+        await reg.clear(1)
+        await reg.clear_active(1)
+        return seen, await reg.get_all(1), await reg.get_active(1), await reg.get_fingerprint(1, 7)
+
+    seen, log_, active, fp = asyncio.run(go())
+    assert seen == (7, "fp", True, None, None)
+    assert (log_, active, fp) == ([], None, None)
+
+
+def test_memory_sweep_forgets_idle_chats():
+    async def go():
+        reg = MemoryRegistry(window=WINDOW)
+        now = time.time()
+        for chat_id, sent_at in ((1, now - WINDOW - 5), (2, now)):
+            await reg.push(chat_id, 7, sent_at=sent_at)
+            await reg.set_active(chat_id, 7)
+            await reg.set_fingerprint(chat_id, 7, "fp")
+        await reg.set_fingerprint(3, 9, "fp")   # журнал уже очищен
+        reg.sweep()
+        return reg
+
+    reg = asyncio.run(go())
+    assert reg.size() == (1, 1)
+    assert list(reg._active) == [2] and list(reg._fp) == [2]
+
+
+def test_sqlite_persists_window_and_cap(tmp_path):
+    path = str(tmp_path / "registry.sqlite3")
+
+    async def write():
+        reg = SQLiteRegistry(path, cap=3, window=WINDOW)
+        await reg.start()
+        now = time.time()
+        await reg.push(1, 10, sent_at=now - WINDOW - 5)
+        for mid in range(11, 16):
+            await reg.push(1, mid, sent_at=now)
+        await reg.set_active(1, 15)
+        await reg.push(2, 20)
+        await reg.set_active(2, 20)
+        await reg.clear_active(2)
+        await reg.close()
+
+    async def read():
+        reg = SQLiteRegistry(path, cap=3, window=WINDOW)
+        await reg.start()
+        try:
+            rows = reg._db.execute("SELECT COUNT(*) FROM registry WHERE chat_id=1").fetchone()[0]
+            return (await reg.get_all(1), await reg.get_active(1), await reg.get_active(2), rows)
+        finally:
+            await reg.close()
+
+    asyncio.run(write())
+    chat1, active1, active2, rows = asyncio.run(read())
+    assert [mid for mid, _ in chat1] == [13, 14, 15]
+    assert rows == 3              # лишнее вычищено и в базе, не только в кэше
+    assert (active1, active2) == (15, None)
+
+
+def test_sqlite_clear_and_cache_eviction(tmp_path):
+    path = str(tmp_path / "registry.sqlite3")
+
+    async def go():
+        reg = SQLiteRegistry(path, cached_chats=2)
+        await reg.start()
+        for chat in (1, 2, 3):
+            await reg.push(chat, chat * 10)
+        await reg.clear(2)
+        await reg.flush()
+        cached = set(reg._logs)
+        # выселенный из кэша чат читается из базы заново
+        result = (await reg.get_all(1), await reg.get_all(2), await reg.get_all(3))
+        await reg.close()
+        return cached, result
+
+    cached, (chat1, chat2, chat3) = asyncio.run(go())
+    assert 1 not in cached
+    assert [mid for mid, _ in chat1] == [10]
+    assert chat2 == []
+    assert [mid for mid, _ in chat3] == [30]
+
+
+def test_make_registry_rejects_unknown_backend(tmp_path):
+    assert isinstance(make_registry("memory", str(tmp_path / "r.db"), cap=5), MemoryRegistry)
+    with pytest.raises(RuntimeError):
+        make_registry("redis", str(tmp_path / "r.db"), cap=5)
@@ -0,0 +1,56 @@
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from screens import Screen, ScreenRegistry, card_fingerprint
+
+
+def make_registry() -> ScreenRegistry:
+    screens = ScreenRegistry()
+    screens.add_pages("teachers_page", [Screen(f"page {n}") for n in (1, 2, 3)])
+    screens.add("menu", Screen("menu"))
+    screens.add("kbk", Screen("club", image="img/KBK.jpg"))
+    return screens
+
+
+def test_exact_keys():
+    screens = make_registry()
+    assert screens.resolve("menu").text == "menu"
+    assert screens.resolve("teachers_page:2").text == "page 2"
+    assert "kbk" in screens and len(screens) == 5
+
+
+def test_family_fallback_for_unknown_argument():
+    screens = make_registry()
+    assert screens.resolve("teachers_page:99").text == "page 3"
+    assert screens.resolve("teachers_page:-1").text == "page 1"
+    assert screens.resolve("teachers_page:abc").text == "page 1"
+    assert screens.resolve("teachers_page:").text == "page 1"
+    assert screens.resolve("teachers_page:0").text == "page 1"
+    assert screens.resolve("teachers_page:+2").text == "page 2"
+
+
+def test_unknown_keys():
+    screens = make_registry()
+    assert screens.resolve("") is None
+    assert screens.resolve("nope") is None
+    assert screens.resolve("nope:1") is None
+    assert screens.resolve("teachers_page") is None   # без «:» семейство не срабатывает
+
+
+def test_images():
+    assert make_registry().images() == {"img/KBK.jpg"}
+
+
+def test_metric_keys_are_bounded():
+    screens = make_registry()
+    assert screens.key_of("menu") == "menu"
+    assert screens.key_of("teachers_page:2") == "teachers_page:2"
+    assert screens.key_of("teachers_page:9999") == "teachers_page:*"
+    assert screens.key_of("garbage:123") == "unknown"
+    assert screens.key_of("garbage") == "unknown"
+
+
+def test_fingerprint_is_computed_once_per_screen():
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Меню", callback_data="menu")]])
+    screen = Screen("<b>text</b>", kb, image="img/KBK.jpg")
+    assert screen.fp == card_fingerprint("<b>text</b>", kb, "img/KBK.jpg")
+    assert Screen("<b>text</b>", kb).fp != screen.fp != Screen("<b>text</b>", image="img/KBK.jpg").fp
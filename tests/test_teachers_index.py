@@ -0,0 +1,86 @@
+import os
+import gc
+import json
+import weakref
+
+import pytest
+
+from teachers_index import Teacher, TeacherIndex, stem
+
+TEACHERS_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "content", "teachers.json")
+
+LINES = [
+    "Артёмов Пётр Ильич — профессор кафедры финансов и учёта, p.artemov@gsom.spbu.ru",
+    "Смирнова Анна Сергеевна — доцент кафедры маркетинга, a.smirnova@gsom.spbu.ru",
+    "Смирнов Олег Ильич — доцент кафедры финансов и учёта, o.smirnov@gsom.spbu.ru",
+    "Ильина Мария Олеговна — старший преподаватель кафедры маркетинга, ilina@gsom.spbu.ru",
+]
+
+
+def names(index: TeacherIndex, query: str):
+    return [t.name.split()[0] for t in index.search(query)]
+
+
+def test_parse():
+    t = Teacher.parse(LINES[1])
+    assert t.name == "Смирнова Анна Сергеевна"
+    assert t.position == "доцент кафедры маркетинга"
+    assert t.department == "маркетинга"
+    assert t.email == "a.smirnova@gsom.spbu.ru"
+
+
+def test_surname_prefix_case_and_yo():
+    index = TeacherIndex(LINES)
+    assert names(index, "СМИР") == ["Смирнова", "Смирнов"]
+    assert names(index, "артем") == ["Артёмов"]
+
+
+def test_surname_matches_rank_first():
+    # «ильи»: фамилия Ильиной раньше отчеств «Ильич»
+    assert names(TeacherIndex(LINES), "ильи") == ["Ильина", "Артёмов", "Смирнов"]
+
+
+def test_department_email_and_intersection():
+    index = TeacherIndex(LINES)
+    assert names(index, "маркетинг") == ["Смирнова", "Ильина"]
+    assert names(index, "smirnov@") == ["Смирнов"]
+    assert names(index, "смир маркетинг") == ["Смирнова"]
+    assert names(index, "смир химии") == []
+    assert index.lookup("  ") == ()
+
+
+def test_index_is_freed_with_its_cache():
+    index = TeacherIndex(LINES)
+    index.lookup("смир")
+    ref = weakref.ref(index)
+    del index
+    gc.collect()
+    assert ref() is None
+
+
+def test_stem():
+    assert stem("маркетинга") == stem("маркетинг") == "маркетинг"
+    assert stem("финансов") == stem("финансы")
+    assert stem("операционного") == stem("операционный")
+    assert stem("технологий") == stem("технологии")
+    assert stem("ия") == "ия"   # короткие не режем
+
+
+@pytest.mark.parametrize("query, department", [
+    ("кафедра маркетинга", "маркетинга"),
+    ("финансы", "финансов и учета"),
+    ("финансы и учёт", "финансов и учета"),
+    ("операционный менеджмент", "операционного менеджмента"),
+    ("информационные технологии", "информационных технологий в менеджменте"),
+    ("управление персоналом", "организационного поведения и управления персоналом"),
+])
+def test_department_queries_from_help_card(query, department):
+    with open(TEACHERS_JSON, encoding="utf-8") as f:
+        index = TeacherIndex(json.load(f))
+    found = index.search(query)
+    assert found
+    assert {t.department for t in found} == {department}
+
+
+def test_stop_words_alone_find_nothing():
+    assert TeacherIndex(LINES).lookup("кафедра") == ()
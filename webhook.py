@@ -0,0 +1,341 @@
+"""Webhook-режим: aiohttp-приёмник обновлений и N процессов-воркеров.
+
+Приёмник отвечает Telegram сразу, а обновление кладёт в очередь воркера
+chat_id % N, так что один чат всегда обслуживает один процесс, а внутри
+процесса обновления чата идут строго по очереди — кроме нажатий кнопок: их
+отрисовки по чату сериализует Coalescer. Общее состояние (активные
+карточки, журнал для /clear) воркеры держат в SQLite-реестре.
+
+Запуск: BOT_MODE=webhook python main.py
+Замер пропускной способности без Telegram: python webhook.py bench --workers 1 2 4
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import importlib
+import multiprocessing as mp
+from typing import Dict, Optional, Set
+
+from aiohttp import web, ClientSession
+
+log = logging.getLogger(__name__)
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")           # публичный адрес для setWebhook; пусто — не регистрируем
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+
+
+def _load_app():
+    """Модуль бота (dp, bot). При запуске через main.py он уже загружен как __main__
+    (в дочернем spawn-процессе — как __mp_main__), повторно не импортируем."""
+    for name in ("__mp_main__", "__main__"):
+        mod = sys.modules.get(name)
+        if mod is not None and hasattr(mod, "dp") and hasattr(mod, "bot"):
+            return mod
+    return importlib.import_module("main")
+
+
+def chat_key(update: dict) -> int:
+    """Ключ маршрутизации: id чата, иначе id пользователя, иначе update_id."""
+    for key, obj in update.items():
+        if not isinstance(obj, dict):
+            continue
+        chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if obj.get("from"):
+            return obj["from"]["id"]
+    return update.get("update_id", 0)
+
+
+def serial_key(update: dict) -> Optional[int]:
+    """Ключ очереди чата; None — без очереди. Нажатие, вставшее за отрисовкой прошлого,
+    не получило бы ни быстрого ответа, ни объединения с соседними (см. Coalescer)."""
+    return None if "callback_query" in update else chat_key(update)
+
+
+class ChatSerializer:
+    """Задачи одного чата выполняются по очереди, разных чатов — параллельно;
+    задачи с ключом None — сразу."""
+
+    def __init__(self):
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._free: Set[asyncio.Task] = set()
+
+    def submit(self, key: Optional[int], coro):
+        if key is None:
+            task = asyncio.create_task(coro)
+            self._free.add(task)
+            task.add_done_callback(self._free.discard)
+            return
+        prev = self._tails.get(key)
+        task = asyncio.create_task(self._after(prev, coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda t: self._tails.pop(key, None) if self._tails.get(key) is t else None)
+
+    @staticmethod
+    async def _after(prev: Optional[asyncio.Task], coro):
+        if prev is not None:
+            await asyncio.wait([prev])
+        await coro
+
+    async def drain(self):
+        while self._tails or self._free:
+            await asyncio.wait([*self._tails.values(), *self._free])
+
+
+async def _feed(app, update: dict):
+    try:
+        await app.dp.feed_raw_update(app.bot, update)
+    except Exception:
+        log.exception("update %s failed", update.get("update_id"))
+
+
+# ======================= ВОРКЕРЫ =======================
+def _worker_main(index: int, queue, done, ready):
+    app = _load_app()
+    asyncio.run(_worker_loop(app, index, queue, done, ready))
+
+async def _worker_loop(app, index: int, queue, done, ready):
+    loop = asyncio.get_running_loop()
+    chats = ChatSerializer()
+    if getattr(app, "METRICS_PORT", 0):
+        app.METRICS_PORT += index   # у каждого воркера свой /metrics: порт, порт+1, ...
+    if index:
+        app.deferred.path += f".{index}"   # и свой файл отложенных удалений
+        app.media_cache.rebase(f"{app.media_cache.path}.{index}")   # и свой кэш file_id
+    await app.dp.emit_startup(bot=app.bot)
+    with ready.get_lock():
+        ready.value += 1
+
+    async def handle(update: dict):
+        await _feed(app, update)
+        with done.get_lock():
+            done[index] += 1
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            update = json.loads(raw)
+            chats.submit(serial_key(update), handle(update))
+        await chats.drain()
+    finally:
+        await app.dp.emit_shutdown(bot=app.bot)
+        await app.bot.session.close()
+
+
+class WorkerPool:
+    """N процессов-воркеров, у каждого своя очередь обновлений."""
+
+    def __init__(self, workers: int):
+        ctx = mp.get_context("spawn")
+        self.queues = [ctx.Queue() for _ in range(workers)]
+        self.done = ctx.Array("q", workers)
+        self.ready = ctx.Value("i", 0)
+        self.procs = [ctx.Process(target=_worker_main, args=(i, q, self.done, self.ready), name=f"bot-worker-{i}", daemon=True)
+                      for i, q in enumerate(self.queues)]
+
+    def start(self):
+        for p in self.procs:
+            p.start()
+
+    async def wait_ready(self):
+        while self.ready.value < len(self.procs):
+            await asyncio.sleep(0.05)
+
+    def route(self, update: dict, raw: bytes):
+        self.queues[chat_key(update) % len(self.queues)].put(raw)
+
+    def processed(self) -> int:
+        return sum(self.done[:])
+
+    async def stop(self, timeout: float = 10):
+        for q in self.queues:
+            q.put(None)
+        for p in self.procs:
+            await asyncio.to_thread(p.join, timeout)
+            if p.is_alive():
+                p.terminate()
+
+
+class InlineWorker:
+    """Один процесс: обновления обрабатываются прямо в приёмнике."""
+
+    def __init__(self, app):
+        self.app, self.chats, self.done = app, ChatSerializer(), 0
+
+    def start(self): pass
+
+    async def wait_ready(self): pass
+
+    def route(self, update: dict, raw: bytes):
+        self.chats.submit(serial_key(update), self._handle(update))
+
+    async def _handle(self, update: dict):
+        await _feed(self.app, update)
+        self.done += 1
+
+    def processed(self) -> int:
+        return self.done
+
+    async def stop(self, timeout: float = 10):
+        await asyncio.wait_for(self.chats.drain(), timeout)
+
+
+def _prepare_env(workers: int):
+    """Настройки, которые воркеры унаследуют при spawn."""
+    if workers > 1:
+        # глобальный лимит Telegram общий на бота — делим его между процессами
+        total = float(os.getenv("TG_GLOBAL_RPS", "30"))
+        os.environ["TG_GLOBAL_RPS"] = str(total / workers)
+        if os.getenv("REGISTRY_BACKEND", "memory") != "sqlite":
+            log.info("WEBHOOK_WORKERS=%d: switching workers to the shared sqlite registry", workers)
+            os.environ["REGISTRY_BACKEND"] = "sqlite"
+
+
+# ======================= ПРИЁМНИК =======================
+def build_app(pool, secret: str = "", path: str = WEBHOOK_PATH) -> web.Application:
+    async def receive(request: web.Request) -> web.Response:
+        if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            return web.Response(status=401)
+        raw = await request.read()
+        try:
+            update = json.loads(raw)
+        except ValueError:
+            return web.Response(status=400)
+        pool.route(update, raw)
+        return web.Response()
+
+    async def on_startup(_):
+        pool.start()
+
+    async def on_cleanup(_):
+        await pool.stop()
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run():
+    app_mod = _load_app()
+    _prepare_env(WEBHOOK_WORKERS)
+    pool = WorkerPool(WEBHOOK_WORKERS) if WEBHOOK_WORKERS > 1 else InlineWorker(app_mod)
+    web_app = build_app(pool, WEBHOOK_SECRET)
+
+    async def on_startup(_):
+        if isinstance(pool, InlineWorker):
+            await app_mod.dp.emit_startup(bot=app_mod.bot)
+        await app_mod.setup_commands()
+        if WEBHOOK_URL:
+            await app_mod.bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None,
+                                          allowed_updates=app_mod.dp.resolve_used_update_types())
+
+    async def on_cleanup(_):
+        if isinstance(pool, InlineWorker):
+            await app_mod.dp.emit_shutdown(bot=app_mod.bot)
+        await app_mod.bot.session.close()
+
+    web_app.on_startup.append(on_startup)
+    web_app.on_cleanup.append(on_cleanup)
+    web.run_app(web_app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
+
+# ======================= ЗАМЕР =======================
+def fake_updates(count: int, chats: int):
+    """Поток синтетических обновлений: /start и переходы по кнопкам от chats пользователей."""
+    from fake_bot_api import message_update, callback_update
+    flow = ["/start", "menu", "laundry", "studclubs", "contacts", "contact_teachers", "teachers_page:2", "back_main"]
+    for n in range(count):
+        cid = 10_000 + n % chats
+        step = flow[(n // chats) % len(flow)]
+        yield message_update(n, cid, step) if step.startswith("/") else callback_update(n, cid, step)
+
+
+async def _bench_once(workers: int, updates: int, chats: int, concurrency: int) -> float:
+    _prepare_env(workers)
+    pool = WorkerPool(workers) if workers > 1 else InlineWorker(_load_app())
+    if isinstance(pool, InlineWorker):
+        await pool.app.dp.emit_startup(bot=pool.app.bot)
+    runner = web.AppRunner(build_app(pool))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+    await pool.wait_ready()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for u in fake_updates(updates, chats):
+        queue.put_nowait(json.dumps(u))
+    started = time.monotonic()
+    async with ClientSession() as http:
+        async def sender():
+            while not queue.empty():
+                async with http.post(url, data=queue.get_nowait()) as resp:
+                    resp.raise_for_status()
+        await asyncio.gather(*(sender() for _ in range(concurrency)))
+    while pool.processed() < updates:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+    await runner.cleanup()
+    if isinstance(pool, InlineWorker):
+        await pool.app.dp.emit_shutdown(bot=pool.app.bot)
+    return elapsed
+
+
+def bench(argv=None):
+    parser = argparse.ArgumentParser(description="Пропускная способность webhook-режима на фейковых обновлениях")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    from fake_bot_api import FakeBotAPI
+
+    async def serve_api():
+        runner = web.AppRunner(FakeBotAPI().app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+    async def go():
+        api_runner, api_port = await serve_api()
+        base = f"http://127.0.0.1:{api_port}"
+        tmp = tempfile.mkdtemp(prefix="gsom-bench-")
+        os.environ.update({"BOT_API_BASE": base, "BOT_TOKEN": "42:bench", "TG_GLOBAL_RPS": "100000",
+                           "TG_CHAT_RPS": "1000", "TG_CHAT_BURST": "1000",
+                           "REGISTRY_DB": os.path.join(tmp, "registry.sqlite3"),
+                           "MEDIA_CACHE_PATH": os.path.join(tmp, "file_ids.json"),
+                           "DEFERRED_PATH": os.path.join(tmp, "deferred.json"),
+                           "BROADCAST_DB": os.path.join(tmp, "broadcast.sqlite3")})
+        try:
+            for n in args.workers:
+                elapsed = await _bench_once(n, args.updates, args.chats, args.concurrency)
+                print(f"workers={n}: {args.updates} updates in {elapsed:.2f}s -> {args.updates / elapsed:.0f} upd/s")
+                os.environ["TG_GLOBAL_RPS"] = "100000"
+        finally:
+            await api_runner.cleanup()
+
+    asyncio.run(go())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    if sys.argv[1:2] == ["bench"]:
+        bench(sys.argv[2:])
+    else:
+        run()